@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Vectorized as-of join over columnar metric indexes.
+
+A columnar index is a directory written by build_index.build_columnar_index:
+    meta.json       key column, value columns and the sorted list of keys
+    offsets.npy     int64 [n_keys + 1], row range of each key
+    timestamp.npy   int64 [n_rows], sorted within each key
+    <column>.npy    float64 [n_rows], one file per value column
+                    (int32 codes into meta.json 'labels' for label columns)
+
+Lookups take arrays of (key, timestamp) queries and resolve all of them with
+two np.searchsorted calls over a combined (key code, timestamp) sort key.
+
+With load_columnar_index(..., slices=True) nothing but meta.json and the
+offsets is read up front: each lookup copies only the requested keys' row
+ranges out of the memory-mapped arrays. That is the fast path for small
+inputs; it does not need pandas.
+"""
+
+import os
+import json
+import bisect
+import numpy as np
+
+# Time interval in milliseconds (60 seconds * 1000)
+TIME_INTERVAL = 60 * 1000
+# Default search window: 5 intervals on either side of the query timestamp
+DEFAULT_WINDOW = 5 * TIME_INTERVAL
+
+# Supported join semantics
+JOIN_MODES = ('nearest', 'backward', 'forward', 'linear')
+
+# Timestamps (ms over 13 days) fit comfortably in the low 32 bits
+TIMESTAMP_BITS = 32
+TIMESTAMP_MAX = (1 << TIMESTAMP_BITS) - 1
+
+
+def load_columnar_index(index_dir, mmap=False, slices=False):
+    """
+    Load a columnar index directory into a dict of numpy arrays.
+    slices=True memory-maps the arrays and defers all per-row work to the
+    lookups, which then only touch the queried keys (see slice_index).
+    """
+    with open(os.path.join(index_dir, 'meta.json')) as f:
+        meta = json.load(f)
+
+    mmap_mode = 'r' if mmap or slices else None
+    index = {
+        'path': index_dir,
+        'key_column': meta['key_column'],
+        'value_columns': meta['value_columns'],
+        'keys': meta['keys'],
+        'offsets': np.load(os.path.join(index_dir, 'offsets.npy')),
+        'timestamp': np.load(os.path.join(index_dir, 'timestamp.npy'), mmap_mode=mmap_mode),
+        'values': {
+            col: np.load(os.path.join(index_dir, f'{col}.npy'), mmap_mode=mmap_mode)
+            for col in meta['value_columns']
+        },
+        # Label columns (e.g. nodeid) as codes plus their vocabulary
+        'labels': {col: np.array(values + [None], dtype=object)
+                   for col, values in meta.get('labels', {}).items()},
+        'label_codes': {
+            col: np.load(os.path.join(index_dir, f'{col}.npy'), mmap_mode=mmap_mode)
+            for col in meta.get('labels', {})
+        },
+    }
+    if slices:
+        return index
+
+    import pandas as pd
+    index['key_index'] = pd.Index(meta['keys'])
+    index['sort_key'] = build_sort_key(index['offsets'], index['timestamp'])
+    return index
+
+
+def slice_index(index, keys):
+    """In-memory index holding only the rows of the given keys (keys are sorted in meta.json)."""
+    all_keys = index['keys']
+    codes = []
+    # Unmatched label lookups (e.g. nodeid) come through as None
+    for key in sorted({key for key in keys if isinstance(key, str)}):
+        pos = bisect.bisect_left(all_keys, key)
+        if pos < len(all_keys) and all_keys[pos] == key:
+            codes.append(pos)
+
+    offsets = index['offsets']
+    counts = np.array([offsets[code + 1] - offsets[code] for code in codes], dtype=np.int64)
+    rows = np.concatenate([np.arange(offsets[code], offsets[code + 1]) for code in codes]
+                          + [np.zeros(0, dtype=np.int64)])
+    sub_offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(counts, out=sub_offsets[1:])
+
+    sub_keys = [all_keys[code] for code in codes]
+    sub = {
+        'path': index['path'],
+        'key_column': index['key_column'],
+        'value_columns': index['value_columns'],
+        'keys': sub_keys,
+        'key_lookup': {key: code for code, key in enumerate(sub_keys)},
+        'offsets': sub_offsets,
+        'timestamp': np.asarray(index['timestamp'][rows], dtype=np.int64),
+        'values': {col: np.asarray(data[rows]) for col, data in index['values'].items()},
+        'labels': index['labels'],
+        'label_codes': {col: np.asarray(data[rows]) for col, data in index['label_codes'].items()},
+    }
+    sub['sort_key'] = build_sort_key(sub_offsets, sub['timestamp'])
+    return sub
+
+
+def build_sort_key(offsets, timestamps):
+    """Combine per-row key codes and timestamps into one sortable int64 array."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    # Anything outside the low bits would spill into the key code
+    if len(timestamps) and (timestamps.min() < 0 or timestamps.max() > TIMESTAMP_MAX):
+        raise ValueError(f"Index timestamps must be within [0, {TIMESTAMP_MAX}], "
+                         f"got [{timestamps.min()}, {timestamps.max()}]")
+    counts = np.diff(offsets)
+    codes = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    return (codes << TIMESTAMP_BITS) | timestamps
+
+
+def build_key_table(keys):
+    """Sorted key names as a fixed-width UTF-8 bytes array (byte order matches str order)."""
+    return np.array([key.encode('utf-8') for key in keys], dtype=np.bytes_ if keys else 'S1')
+
+
+def encode_keys(index, keys):
+    """Map query key names to index key codes (-1 for unknown keys)."""
+    if 'key_table' in index:
+        # Binary search in a shared key table (see index_server.attach_indexes)
+        table = index['key_table']
+        query = np.array([key.encode('utf-8') if isinstance(key, str) else b'' for key in keys],
+                         dtype=np.bytes_)
+        if len(table) == 0 or len(query) == 0:
+            return np.full(len(query), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(table, query), len(table) - 1)
+        # Compare against the untruncated queries: searchsorted casts them to the table width
+        found = (table[pos] == query) & (query != b'')
+        return np.where(found, pos, -1).astype(np.int64)
+
+    if 'key_lookup' in index:
+        lookup = index['key_lookup']
+        return np.array([lookup.get(key, -1) for key in keys], dtype=np.int64)
+
+    import pandas as pd
+    return index['key_index'].get_indexer(pd.Index(keys, dtype=object)).astype(np.int64)
+
+
+def asof_lookup(index, keys, timestamps, mode='nearest', window=DEFAULT_WINDOW, columns=None):
+    """
+    Join each (key, timestamp) query against the index.
+
+    mode:
+        nearest   closest sample on either side (ties go to the earlier one)
+        backward  latest sample at or before the timestamp
+        forward   earliest sample at or after the timestamp
+        linear    interpolate between the samples on either side; falls back
+                  to the nearest sample when only one side is in the window
+    window: maximum distance in ms between the query and a usable sample.
+
+    columns: value columns to return (default: all); label columns may also be
+    requested and come from the sample the mode selects (the nearest one for
+    linear, since labels cannot be interpolated).
+
+    Returns (values, lag) where values maps column -> float64 array (object
+    array for labels, None where unmatched) and lag is the distance in ms to
+    the closest sample used (NaN where nothing matched).
+    """
+    if mode not in JOIN_MODES:
+        raise ValueError(f"Unknown join mode '{mode}', expected one of {JOIN_MODES}")
+
+    columns = columns or index['value_columns']
+    if 'sort_key' not in index:
+        # Index loaded with slices=True: materialize just the queried keys
+        index = slice_index(index, keys)
+    codes = encode_keys(index, keys)
+    query_ts = np.asarray(timestamps, dtype=np.float64)
+    n = len(codes)
+
+    # Queries with unknown keys or missing timestamps can never match
+    valid = (codes >= 0) & ~np.isnan(query_ts)
+    query_ts_int = np.where(valid, query_ts, 0).astype(np.int64)
+    # Clamp into the key's timestamp bits; the distance checks below reject
+    # the samples a clamped query lands on from the wrong side
+    query_key = (np.where(valid, codes, 0) << TIMESTAMP_BITS) | np.clip(query_ts_int, 0, TIMESTAMP_MAX)
+
+    sort_key = index['sort_key']
+    sample_ts = index['timestamp']
+    total = len(sort_key)
+    if total == 0:
+        empty = np.full(n, np.nan)
+        values = {col: np.full(n, None, dtype=object) if col in index['labels'] else empty.copy()
+                  for col in columns}
+        return values, empty
+
+    # Last sample <= query and first sample >= query, restricted to the same key
+    left = np.searchsorted(sort_key, query_key, side='right') - 1
+    right = np.searchsorted(sort_key, query_key, side='left')
+    left_clipped = np.clip(left, 0, total - 1)
+    right_clipped = np.clip(right, 0, total - 1)
+
+    left_ok = valid & (left >= 0) & ((sort_key[left_clipped] >> TIMESTAMP_BITS) == codes)
+    right_ok = valid & (right < total) & ((sort_key[right_clipped] >> TIMESTAMP_BITS) == codes)
+
+    left_dist = np.where(left_ok, query_ts_int - np.asarray(sample_ts[left_clipped], dtype=np.int64), 0)
+    right_dist = np.where(right_ok, np.asarray(sample_ts[right_clipped], dtype=np.int64) - query_ts_int, 0)
+    left_ok &= (left_dist >= 0) & (left_dist <= window)
+    right_ok &= (right_dist >= 0) & (right_dist <= window)
+
+    if mode == 'backward':
+        use_left, use_right = left_ok, np.zeros(n, dtype=bool)
+    elif mode == 'forward':
+        use_left, use_right = np.zeros(n, dtype=bool), right_ok
+    else:
+        # Nearest side wins; the earlier sample wins ties
+        prefer_left = left_ok & (~right_ok | (left_dist <= right_dist))
+        use_left, use_right = prefer_left, right_ok & ~prefer_left
+
+    lag = np.full(n, np.nan)
+    lag[use_left] = left_dist[use_left]
+    lag[use_right] = right_dist[use_right]
+
+    values = {}
+    for col in columns:
+        if col in index['labels']:
+            codes_used = np.full(n, -1, dtype=np.int64)
+            label_data = index['label_codes'][col]
+            codes_used[use_left] = label_data[left_clipped[use_left]]
+            codes_used[use_right] = label_data[right_clipped[use_right]]
+            # Code -1 selects the trailing None in the vocabulary
+            values[col] = index['labels'][col][codes_used]
+            continue
+
+        data = index['values'][col]
+        left_vals = np.asarray(data[left_clipped], dtype=np.float64)
+        right_vals = np.asarray(data[right_clipped], dtype=np.float64)
+
+        result = np.full(n, np.nan)
+        result[use_left] = left_vals[use_left]
+        result[use_right] = right_vals[use_right]
+
+        if mode == 'linear':
+            span = left_dist + right_dist
+            both = left_ok & right_ok & (span > 0)
+            weight = np.divide(left_dist, span, out=np.zeros(n), where=both)
+            interpolated = left_vals + (right_vals - left_vals) * weight
+            # Keep the nearest-sample value where interpolation hits a gap
+            both &= ~np.isnan(interpolated)
+            result[both] = interpolated[both]
+
+        values[col] = result
+
+    return values, lag
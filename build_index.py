@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 import os
+import json
+import numpy as np
 import pandas as pd
 import pickle
 import argparse
 import time
 
+from asof_join import TIMESTAMP_MAX
+
 def build_msmetrics_index(folder_path):
     """Build an index for MSMetrics folder with pre-aligned timestamps."""
     print(f"Building index for MSMetrics in {folder_path}...")
@@ -122,6 +126,82 @@ def build_msrtmcr_index(folder_path):
     
     return mcr_index
 
+def read_metrics_folder(folder_path, columns):
+    """Read the given columns from every CSV file in a metrics folder."""
+    frames = []
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.endswith('.csv'):
+            file_path = os.path.join(folder_path, filename)
+            try:
+                # Read only necessary columns to save memory
+                frames.append(pd.read_csv(file_path, usecols=columns))
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+def build_columnar_index(folder_path, key_column, value_columns, label_columns=(),
+                         index_name=None, frame=None):
+    """Build a columnar as-of join index (see asof_join.py) for one key column.
+
+    Rows sharing (key, timestamp) are averaged, so a service-level index holds
+    the mean over all of the service's containers at each 60s sample. Label
+    columns (e.g. the nodeid hosting an instance) keep their first value and
+    are stored as integer codes.
+    """
+    index_name = index_name or f"columnar_{key_column}"
+    label_columns = list(label_columns)
+    print(f"Building columnar '{key_column}' index for {folder_path}...")
+    start_time = time.time()
+
+    columns = ['timestamp', key_column] + value_columns + label_columns
+    if frame is None:
+        df = read_metrics_folder(folder_path, columns)
+    else:
+        df = frame[columns]
+    df = df.dropna(subset=['timestamp', key_column])
+    df = df.assign(timestamp=df['timestamp'].astype(np.int64))
+    # asof_join packs timestamps into the low 32 bits of its sort key
+    if len(df) and (df['timestamp'].min() < 0 or df['timestamp'].max() > TIMESTAMP_MAX):
+        raise ValueError(f"Timestamps in {folder_path} must be within [0, {TIMESTAMP_MAX}]")
+
+    # One sample per (key, timestamp), sorted by key then time
+    aggregations = {col: 'mean' for col in value_columns}
+    aggregations.update({col: 'first' for col in label_columns})
+    df = df.groupby([key_column, 'timestamp'], sort=True).agg(aggregations).reset_index()
+    keys, codes = np.unique(df[key_column].astype(str).values, return_inverse=True)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(keys)), out=offsets[1:])
+
+    index_dir = os.path.join(folder_path, index_name)
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, 'offsets.npy'), offsets)
+    np.save(os.path.join(index_dir, 'timestamp.npy'), df['timestamp'].values.astype(np.int64))
+    for col in value_columns:
+        np.save(os.path.join(index_dir, f'{col}.npy'), pd.to_numeric(df[col], errors='coerce').values.astype(np.float64))
+    labels = {}
+    for col in label_columns:
+        label_codes, label_values = pd.factorize(df[col], sort=True)
+        np.save(os.path.join(index_dir, f'{col}.npy'), label_codes.astype(np.int32))
+        labels[col] = [str(value) for value in label_values]
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+        json.dump({
+            'key_column': key_column,
+            'value_columns': value_columns,
+            'labels': labels,
+            'keys': keys.tolist(),
+        }, f)
+
+    elapsed_time = time.time() - start_time
+    print(f"Finished building columnar index in {elapsed_time:.2f} seconds")
+    print(f"Saved index to {index_dir}")
+    print(f"- Total keys: {len(keys)}")
+    print(f"- Total samples: {len(df)}")
+
+    return index_dir
+
 def test_index(index_type, index_path):
     """Test the created index to ensure it's working as expected."""
     print(f"\nTesting {index_type} index at {index_path}...")
@@ -166,6 +246,12 @@ def main():
                         help='Build only MSMetrics index')
     parser.add_argument('--msrtmcr-only', action='store_true',
                         help='Build only MSRTMCR index')
+    parser.add_argument('--nodemetrics-only', action='store_true',
+                        help='Build only NodeMetrics index')
+    parser.add_argument('--skip-instance', action='store_true',
+                        help='Skip the per-instance (msinstanceid) indexes')
+    parser.add_argument('--with-pickle', action='store_true',
+                        help='Also build the legacy dict-of-dicts index.pkl files')
     
     args = parser.parse_args()
     
@@ -173,24 +259,49 @@ def main():
     print(f"Base Path: {args.base_path}")
     print("Using pre-aligned timestamps (60-second intervals)")
     
+    # With no --*-only flag every index is built
+    build_all = not (args.msmetrics_only or args.msrtmcr_only or args.nodemetrics_only)
+    
     # Build MSMetrics index
-    if not args.msrtmcr_only:
+    if build_all or args.msmetrics_only:
         msmetrics_path = os.path.join(args.base_path, 'MSMetrics')
         if os.path.exists(msmetrics_path):
-            build_msmetrics_index(msmetrics_path)
-            test_index("MSMetrics", os.path.join(msmetrics_path, "index.pkl"))
+            metric_columns = ['cpu_utilization', 'memory_utilization']
+            frame = read_metrics_folder(msmetrics_path, ['timestamp', 'msname', 'msinstanceid', 'nodeid'] + metric_columns)
+            build_columnar_index(msmetrics_path, 'msname', metric_columns, frame=frame)
+            if not args.skip_instance:
+                build_columnar_index(msmetrics_path, 'msinstanceid', metric_columns,
+                                     label_columns=['nodeid'], frame=frame)
+            del frame
+            if args.with_pickle:
+                build_msmetrics_index(msmetrics_path)
+                test_index("MSMetrics", os.path.join(msmetrics_path, "index.pkl"))
         else:
             print(f"Error: MSMetrics folder not found at {msmetrics_path}")
     
     # Build MSRTMCR index
-    if not args.msmetrics_only:
+    if build_all or args.msrtmcr_only:
         msrtmcr_path = os.path.join(args.base_path, 'MSRTMCR')
         if os.path.exists(msrtmcr_path):
-            build_msrtmcr_index(msrtmcr_path)
-            test_index("MSRTMCR", os.path.join(msrtmcr_path, "index.pkl"))
+            frame = read_metrics_folder(msrtmcr_path, ['timestamp', 'msname', 'msinstanceid', 'providerrpc_mcr'])
+            build_columnar_index(msrtmcr_path, 'msname', ['providerrpc_mcr'], frame=frame)
+            if not args.skip_instance:
+                build_columnar_index(msrtmcr_path, 'msinstanceid', ['providerrpc_mcr'], frame=frame)
+            del frame
+            if args.with_pickle:
+                build_msrtmcr_index(msrtmcr_path)
+                test_index("MSRTMCR", os.path.join(msrtmcr_path, "index.pkl"))
         else:
             print(f"Error: MSRTMCR folder not found at {msrtmcr_path}")
     
+    # Build NodeMetrics index
+    if build_all or args.nodemetrics_only:
+        nodemetrics_path = os.path.join(args.base_path, 'NodeMetrics')
+        if os.path.exists(nodemetrics_path):
+            build_columnar_index(nodemetrics_path, 'nodeid', ['cpu_utilization', 'memory_utilization'])
+        else:
+            print(f"Error: NodeMetrics folder not found at {nodemetrics_path}")
+    
     print("\nIndex building completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Compact per-trace call-tree index built from CallGraph files.
+
+Calls are stored sorted by traceid in flat arrays, with trace_offsets
+giving each trace's row range (CSR layout):
+    rpcid / prefix  int32 codes into the rpcid vocabulary (prefix from parse_rpcid)
+    parent          int32 row of the parent call within the trace, -1 if absent
+    depth           int16 number of rpcid segments minus one
+    um / dm         int32 codes into the service vocabulary
+    timestamp, rt   call start (ms) and response time
+
+The index is saved as a single .npz and answers children, depth-k sibling,
+critical-path and fan-out queries without rescanning the raw trace.
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+from sibling_identifier import parse_rpcid
+
+CALL_COLUMNS = ['traceid', 'rpcid', 'um', 'dm', 'timestamp', 'rt']
+
+
+def build_call_tree_index(input_folder, output_path="output/call_tree.npz"):
+    """Build and save the call-tree index for every CSV in input_folder."""
+    frames = []
+    for filename in sorted(os.listdir(input_folder)):
+        if filename.endswith('.csv'):
+            file_path = os.path.join(input_folder, filename)
+            try:
+                frames.append(pd.read_csv(file_path, usecols=CALL_COLUMNS))
+            except Exception as e:
+                print(f"Error processing {filename}: {str(e)}")
+    if not frames:
+        raise ValueError(f"No CSV files found in {input_folder}")
+
+    df = pd.concat(frames, ignore_index=True).dropna(subset=['traceid', 'rpcid'])
+    df['rpcid'] = df['rpcid'].astype(str)
+    df = df.sort_values(['traceid', 'rpcid'], kind='stable').reset_index(drop=True)
+    print(f"Loaded {len(df):,} calls")
+
+    # parse_rpcid runs once per distinct rpcid, not once per call
+    local_codes, rpcid_values = pd.factorize(df['rpcid'])
+    prefixes = [parse_rpcid(rpcid)[0] for rpcid in rpcid_values]
+    vocab = pd.Index(list(rpcid_values)).append(pd.Index(prefixes)).unique()
+    rpcid_codes = vocab.get_indexer(rpcid_values)[local_codes]
+    prefix_codes = vocab.get_indexer(prefixes)[local_codes]
+    depth = np.array([rpcid.count('.') for rpcid in rpcid_values], dtype=np.int16)[local_codes]
+
+    trace_ids, trace_codes = np.unique(df['traceid'].astype(str).values, return_inverse=True)
+    trace_offsets = np.zeros(len(trace_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(trace_codes, minlength=len(trace_ids)), out=trace_offsets[1:])
+
+    # Parent pointer: first call in the same trace whose rpcid equals our prefix
+    row_keys = pd.MultiIndex.from_arrays([trace_codes, rpcid_codes])
+    first_rows = pd.Series(np.arange(len(df)), index=row_keys)
+    first_rows = first_rows[~first_rows.index.duplicated()]
+    parent = first_rows.reindex(pd.MultiIndex.from_arrays([trace_codes, prefix_codes])).values
+    is_root = prefix_codes == rpcid_codes
+    parent = np.where(np.isnan(parent) | is_root, -1, parent - trace_offsets[trace_codes])
+
+    services = pd.Index(pd.concat([df['um'], df['dm']]).astype(str).unique())
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    np.savez(
+        output_path,
+        trace_ids=np.array(trace_ids, dtype=str),
+        trace_offsets=trace_offsets,
+        rpcid_vocab=np.array(vocab, dtype=str),
+        rpcid=rpcid_codes.astype(np.int32),
+        prefix=prefix_codes.astype(np.int32),
+        parent=parent.astype(np.int32),
+        depth=depth,
+        services=np.array(services, dtype=str),
+        um=services.get_indexer(df['um'].astype(str)).astype(np.int32),
+        dm=services.get_indexer(df['dm'].astype(str)).astype(np.int32),
+        timestamp=df['timestamp'].values.astype(np.int64),
+        rt=pd.to_numeric(df['rt'], errors='coerce').values.astype(np.float32),
+    )
+    print(f"Saved call-tree index for {len(trace_ids):,} traces to {output_path}")
+    return output_path
+
+
+class CallTreeIndex:
+    def __init__(self, path="output/call_tree.npz"):
+        """Load a saved call-tree index"""
+        data = np.load(path)
+        self.trace_ids = data['trace_ids']
+        self.trace_offsets = data['trace_offsets']
+        self.rpcid_vocab = data['rpcid_vocab']
+        self.rpcid_lookup = {rpcid: code for code, rpcid in enumerate(self.rpcid_vocab)}
+        self.services = data['services']
+        self.service_lookup = {name: code for code, name in enumerate(self.services)}
+        self.arrays = {name: data[name] for name in
+                       ('rpcid', 'prefix', 'parent', 'depth', 'um', 'dm', 'timestamp', 'rt')}
+
+    def trace_range(self, traceid):
+        """Row range [start, end) of a trace, or None if unknown"""
+        pos = np.searchsorted(self.trace_ids, traceid)
+        if pos >= len(self.trace_ids) or self.trace_ids[pos] != traceid:
+            return None
+        return int(self.trace_offsets[pos]), int(self.trace_offsets[pos + 1])
+
+    def frame(self, start, end, rows=None):
+        """Decode rows [start, end) (optionally a subset of local rows) to a DataFrame"""
+        local = np.arange(end - start) if rows is None else np.asarray(rows, dtype=np.int64)
+        idx = start + local
+        a = self.arrays
+        return pd.DataFrame({
+            'row': local,
+            'rpcid': self.rpcid_vocab[a['rpcid'][idx]],
+            'parent': a['parent'][idx],
+            'depth': a['depth'][idx],
+            'um': self.services[a['um'][idx]],
+            'dm': self.services[a['dm'][idx]],
+            'timestamp': a['timestamp'][idx],
+            'rt': a['rt'][idx],
+        })
+
+    def trace(self, traceid):
+        """All calls of one trace"""
+        bounds = self.trace_range(traceid)
+        if bounds is None:
+            return self.frame(0, 0)
+        return self.frame(*bounds)
+
+    def children(self, traceid, rpcid):
+        """Calls made directly under rpcid (its prefix group, as in sibling detection)"""
+        bounds = self.trace_range(traceid)
+        code = self.rpcid_lookup.get(rpcid)
+        if bounds is None or code is None:
+            return self.frame(0, 0)
+        start, end = bounds
+        prefix = self.arrays['prefix'][start:end]
+        own = self.arrays['rpcid'][start:end]
+        return self.frame(start, end, np.nonzero((prefix == code) & (own != code))[0])
+
+    def siblings(self, traceid, rpcid, level=1):
+        """
+        Depth-k siblings: calls at the same depth sharing rpcid's ancestor
+        `level` steps up (level=1 siblings, level=2 cousins, ...).
+        Raises ValueError when the ancestor would lie above the root.
+        """
+        if not 1 <= level <= rpcid.count('.'):
+            raise ValueError(f"level must be between 1 and {rpcid.count('.')} for rpcid '{rpcid}', got {level}")
+        bounds = self.trace_range(traceid)
+        if bounds is None:
+            return self.frame(0, 0)
+        ancestor = rpcid
+        for _ in range(level):
+            ancestor, _ = parse_rpcid(ancestor)
+        start, end = bounds
+        trace_rpcids = self.rpcid_vocab[self.arrays['rpcid'][start:end]]
+        depth = self.arrays['depth'][start:end]
+        mask = ((depth == rpcid.count('.'))
+                & np.char.startswith(trace_rpcids, ancestor + '.')
+                & (trace_rpcids != rpcid))
+        return self.frame(start, end, np.nonzero(mask)[0])
+
+    def critical_path(self, traceid):
+        """Follow, from the root, the child that finishes last at every level"""
+        bounds = self.trace_range(traceid)
+        if bounds is None:
+            return self.frame(0, 0)
+        start, end = bounds
+        parent = self.arrays['parent'][start:end]
+        finish = self.arrays['timestamp'][start:end] + self.arrays['rt'][start:end]
+
+        children = {}
+        for row, p in enumerate(parent):
+            children.setdefault(int(p), []).append(row)
+        # Roots (and calls whose parent is missing) hang off -1
+        path = []
+        current = -1
+        while current in children:
+            current = max(children[current], key=lambda row: finish[row])
+            path.append(current)
+        return self.frame(start, end, path)
+
+    def fan_out(self, um):
+        """Downstream services called by `um` across all traces, with call counts"""
+        code = self.service_lookup.get(um)
+        if code is None:
+            return pd.Series(dtype=np.int64, name='calls')
+        dms = self.arrays['dm'][self.arrays['um'] == code]
+        counts = np.bincount(dms, minlength=len(self.services))
+        nonzero = np.nonzero(counts)[0]
+        result = pd.Series(counts[nonzero], index=self.services[nonzero], name='calls')
+        return result.sort_values(ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the per-trace call-tree index')
+    parser.add_argument('--index', default='output/call_tree.npz', help='Index file path')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Build the index from CallGraph CSVs')
+    build_parser.add_argument('input_folder', help='Folder containing CallGraph CSV files')
+    for name, help_text in (('children', 'Children of an rpcid'),
+                            ('siblings', 'Depth-k siblings of an rpcid'),
+                            ('critical-path', 'Critical path of a trace')):
+        query = subparsers.add_parser(name, help=help_text)
+        query.add_argument('traceid')
+        if name != 'critical-path':
+            query.add_argument('rpcid')
+        if name == 'siblings':
+            query.add_argument('--level', type=int, default=1, help='Levels up to the shared ancestor')
+    fanout_parser = subparsers.add_parser('fanout', help='Downstream fan-out of a service')
+    fanout_parser.add_argument('um')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_call_tree_index(args.input_folder, args.index)
+        return
+
+    index = CallTreeIndex(args.index)
+    if args.command == 'children':
+        result = index.children(args.traceid, args.rpcid)
+    elif args.command == 'siblings':
+        try:
+            result = index.siblings(args.traceid, args.rpcid, level=args.level)
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == 'critical-path':
+        result = index.critical_path(args.traceid)
+    else:
+        result = index.fan_out(args.um)
+    print(result.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,284 +1,249 @@
 #!/usr/bin/env python3
 import os
-import pandas as pd
-import multiprocessing as mp
-from concurrent.futures import ProcessPoolExecutor
+import csv
 import time
-import pickle
+import numpy as np
 
-# Time interval in milliseconds (60 seconds * 1000)
-TIME_INTERVAL = 60 * 1000
-# Maximum number of intervals to try (5 before + 5 after = 10 minutes total)
-MAX_INTERVALS = 5
+from asof_join import DEFAULT_WINDOW, JOIN_MODES, asof_lookup, load_columnar_index
 
-def load_metrics_index():
+# Pre-built columnar indexes (see build_index.py)
+INDEX_BASE = 'output/data'
+METRICS_INDEX_PATH = 'output/data/MSMetrics/columnar_msname'
+MCR_INDEX_PATH = 'output/data/MSRTMCR/columnar_msname'
+# Optional per-pod and per-host indexes
+INSTANCE_METRICS_INDEX_PATH = 'output/data/MSMetrics/columnar_msinstanceid'
+INSTANCE_MCR_INDEX_PATH = 'output/data/MSRTMCR/columnar_msinstanceid'
+NODE_METRICS_INDEX_PATH = 'output/data/NodeMetrics/columnar_nodeid'
+
+# Pair tallies of sibling_identifier.py --compact rows (SIBLING_COMPACT_FIELDNAMES)
+COMPACT_COLUMNS = ['dm1_calls', 'dm2_calls', 'multiplicity', 'concurrent', 'sequential']
+
+# Inputs up to this size skip pandas and read only the queried keys' index slices
+SMALL_INPUT_BYTES = 1 << 20
+
+def index_path(default_path, index_base=None):
+    """Re-root one of the default index paths under another data folder."""
+    if index_base is None:
+        return default_path
+    return os.path.join(index_base, os.path.relpath(default_path, INDEX_BASE))
+
+def load_metrics_index(index_path=METRICS_INDEX_PATH, slices=False):
     """Load metrics index from the predefined location."""
-    index_path = 'output/data/MSMetrics/index.pkl'
     try:
         print(f"Loading metrics index from: {index_path}")
-        with open(index_path, 'rb') as f:
-            metrics_index = pickle.load(f)
-        print(f"Loaded metrics index with {len(metrics_index)} time intervals")
+        metrics_index = load_columnar_index(index_path, slices=slices)
+        print(f"Loaded metrics index with {len(metrics_index['keys'])} services")
         return metrics_index
     except Exception as e:
         print(f"Error loading metrics index: {str(e)}")
         raise
 
-def load_mcr_index():
+def load_mcr_index(index_path=MCR_INDEX_PATH, slices=False):
     """Load MCR index from the predefined location."""
-    index_path = 'output/data/MSRTMCR/index.pkl'
     try:
         print(f"Loading MCR index from: {index_path}")
-        with open(index_path, 'rb') as f:
-            mcr_index = pickle.load(f)
-        print(f"Loaded MCR index with {len(mcr_index)} time intervals")
+        mcr_index = load_columnar_index(index_path, slices=slices)
+        print(f"Loaded MCR index with {len(mcr_index['keys'])} services")
         return mcr_index
     except Exception as e:
         print(f"Error loading MCR index: {str(e)}")
         raise
 
-def find_ms_metrics_optimized(msname, timestamp, metrics_index):
-    """Find microservice metrics using expanding radius search."""
-    # Align timestamp to interval
-    base_interval = (timestamp // TIME_INTERVAL) * TIME_INTERVAL
-    
-    # First check the exact interval
-    if base_interval in metrics_index and msname in metrics_index[base_interval]:
-        records = metrics_index[base_interval][msname]
-        if records:
-            # Take the first record since timestamps are already aligned
-            record = records[0]
-            cpu = record.get('cpu_utilization')
-            memory = record.get('memory_utilization')
-            # Calculate actual time difference
-            time_diff = abs(record['timestamp'] - timestamp)
-            return cpu, memory, time_diff
-    
-    # If not found in exact interval, search outward with increasing radius
-    for radius in range(1, MAX_INTERVALS + 1):
-        # Check interval to the left
-        left_interval = base_interval - (radius * TIME_INTERVAL)
-        if left_interval in metrics_index and msname in metrics_index[left_interval]:
-            records = metrics_index[left_interval][msname]
-            if records:
-                record = records[0]
-                cpu = record.get('cpu_utilization')
-                memory = record.get('memory_utilization')
-                # Calculate actual time difference
-                time_diff = abs(record['timestamp'] - timestamp)
-                return cpu, memory, time_diff
-        
-        # Check interval to the right
-        right_interval = base_interval + (radius * TIME_INTERVAL)
-        if right_interval in metrics_index and msname in metrics_index[right_interval]:
-            records = metrics_index[right_interval][msname]
-            if records:
-                record = records[0]
-                cpu = record.get('cpu_utilization')
-                memory = record.get('memory_utilization')
-                # Calculate actual time difference
-                time_diff = abs(record['timestamp'] - timestamp)
-                return cpu, memory, time_diff
+def load_context_indexes(index_base=None, slices=False):
+    """Load the instance and node indexes, or return None if any is missing."""
+    paths = {
+        'instance_metrics': index_path(INSTANCE_METRICS_INDEX_PATH, index_base),
+        'instance_mcr': index_path(INSTANCE_MCR_INDEX_PATH, index_base),
+        'node_metrics': index_path(NODE_METRICS_INDEX_PATH, index_base),
+    }
+    missing = [path for path in paths.values() if not os.path.exists(path)]
+    if missing:
+        print(f"Instance/node context disabled, index not found: {', '.join(missing)}")
+        return None
     
-    # If we get here, no match was found within the radius
-    return None, None, None
+    context_indexes = {}
+    for name, path in paths.items():
+        print(f"Loading {name.replace('_', ' ')} index from: {path}")
+        context_indexes[name] = load_columnar_index(path, slices=slices)
+    print(f"Loaded context indexes with {len(context_indexes['instance_metrics']['keys'])} instances "
+          f"and {len(context_indexes['node_metrics']['keys'])} nodes")
+    return context_indexes
 
-def find_mcr_optimized(msname, timestamp, mcr_index):
-    """Find MCR using expanding radius search."""
-    # Align timestamp to interval
-    base_interval = (timestamp // TIME_INTERVAL) * TIME_INTERVAL
-    
-    # First check the exact interval
-    if base_interval in mcr_index and msname in mcr_index[base_interval]:
-        records = mcr_index[base_interval][msname]
-        if records:
-            # With aligned timestamps, we may still have multiple MCR values
-            # so we average them as in the original code
-            mcr_values = [record.get('mcr') for record in records if record.get('mcr') is not None]
-            if mcr_values:
-                avg_mcr = sum(mcr_values) / len(mcr_values)
-                # Calculate actual time difference - using the timestamp of the first record
-                time_diff = abs(records[0]['timestamp'] - timestamp)
-                return avg_mcr, time_diff
-    
-    # If not found in exact interval, search outward with increasing radius
-    for radius in range(1, MAX_INTERVALS + 1):
-        # Check interval to the left
-        left_interval = base_interval - (radius * TIME_INTERVAL)
-        if left_interval in mcr_index and msname in mcr_index[left_interval]:
-            records = mcr_index[left_interval][msname]
-            if records:
-                mcr_values = [record.get('mcr') for record in records if record.get('mcr') is not None]
-                if mcr_values:
-                    avg_mcr = sum(mcr_values) / len(mcr_values)
-                    # Calculate actual time difference - using the timestamp of the first record
-                    time_diff = abs(records[0]['timestamp'] - timestamp)
-                    return avg_mcr, time_diff
-        
-        # Check interval to the right
-        right_interval = base_interval + (radius * TIME_INTERVAL)
-        if right_interval in mcr_index and msname in mcr_index[right_interval]:
-            records = mcr_index[right_interval][msname]
-            if records:
-                mcr_values = [record.get('mcr') for record in records if record.get('mcr') is not None]
-                if mcr_values:
-                    avg_mcr = sum(mcr_values) / len(mcr_values)
-                    # Calculate actual time difference - using the timestamp of the first record
-                    time_diff = abs(records[0]['timestamp'] - timestamp)
-                    return avg_mcr, time_diff
-    
-    # If we get here, no match was found within the radius
-    return None, None
+def to_float(values):
+    """Convert a column to float64, with NaN for anything non-numeric."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        result = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                result[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return result
 
-def process_row_optimized(args):
-    """Process a single row with optimized lookup."""
-    idx, row, metrics_index, mcr_index = args
+def enrich_instance_context(output_df, input_df, context_indexes, join_mode='nearest',
+                            window=DEFAULT_WINDOW):
+    """Add per-pod and per-host load for dm1 and dm2 from dminstanceid1/dminstanceid2."""
+    for side, instance_column in (('dm1', 'dminstanceid1'), ('dm2', 'dminstanceid2')):
+        instances = np.asarray(input_df[instance_column]).astype(str)
+        start_times = to_float(input_df[f'{side}_start_time'])
+        
+        instance_metrics, _ = asof_lookup(context_indexes['instance_metrics'], instances, start_times,
+                                          mode=join_mode, window=window,
+                                          columns=['cpu_utilization', 'memory_utilization', 'nodeid'])
+        instance_mcr, _ = asof_lookup(context_indexes['instance_mcr'], instances, start_times,
+                                      mode=join_mode, window=window)
+        # The hosting node is taken from the instance's nearest MSMetrics sample
+        node_metrics, _ = asof_lookup(context_indexes['node_metrics'], instance_metrics['nodeid'],
+                                      start_times, mode=join_mode, window=window)
+        
+        output_df[f'{side}_instance_cpu'] = instance_metrics['cpu_utilization']
+        output_df[f'{side}_instance_memory'] = instance_metrics['memory_utilization']
+        output_df[f'{side}_instance_mcr'] = instance_mcr['providerrpc_mcr']
+        output_df[f'{side}_nodeid'] = instance_metrics['nodeid']
+        output_df[f'{side}_node_cpu'] = node_metrics['cpu_utilization']
+        output_df[f'{side}_node_memory'] = node_metrics['memory_utilization']
     
-    try:
-        # Extract values from row
-        um = row.get('um')
-        dm1 = row.get('dm1')
-        dm1_start_time = row.get('dm1_start_time')
-        dm2 = row.get('dm2')
-        dm2_start_time = row.get('dm2_start_time')
-        execution_order = row.get('execution_order')
+    return output_df
 
-        # Find metrics for both microservices using optimized functions
-        dm1_cpu, dm1_memory, dm1_system_lag = find_ms_metrics_optimized(dm1, dm1_start_time, metrics_index)
-        dm1_mcr, dm1_mcr_lag = find_mcr_optimized(dm1, dm1_start_time, mcr_index)
-        dm2_cpu, dm2_memory, dm2_system_lag = find_ms_metrics_optimized(dm2, dm2_start_time, metrics_index)
-        dm2_mcr, dm2_mcr_lag = find_mcr_optimized(dm2, dm2_start_time, mcr_index)
+def enrich_columns(input_df, metrics_index, mcr_index, join_mode='nearest',
+                   window=DEFAULT_WINDOW, context_indexes=None):
+    """
+    Attach cpu/memory/mcr context for dm1 and dm2 to every row in one vectorized pass.
+    input_df is a DataFrame or a dict of columns; returns an ordered dict of output columns.
+    """
+    output_df = {
+        'um': np.asarray(input_df['um']),
+        'dm1': np.asarray(input_df['dm1']),
+        'dm2': np.asarray(input_df['dm2']),
+        'execution_order': np.asarray(input_df['execution_order']),
+    }
+    # Compact sibling rows keep their pair tallies so the statistics stay exact
+    for name in COMPACT_COLUMNS:
+        if name in input_df:
+            output_df[name] = np.asarray(input_df[name])
 
-        # Create output row
-        output_row = {
-            'um': um,
-            'dm1': dm1,
-            'dm2': dm2,
-            'execution_order': execution_order,
-            'dm1_cpu': dm1_cpu,
-            'dm2_cpu': dm2_cpu,
-            'dm1_memory': dm1_memory,
-            'dm2_memory': dm2_memory,
-            'dm1_system_lag': dm1_system_lag,
-            'dm2_system_lag': dm2_system_lag,
-            'dm1_mcr': dm1_mcr,
-            'dm2_mcr': dm2_mcr,
-            'dm1_mcr_lag': dm1_mcr_lag,
-            'dm2_mcr_lag': dm2_mcr_lag
+    lookups = {}
+    for side in ('dm1', 'dm2'):
+        services = np.asarray(input_df[side]).astype(str)
+        start_times = to_float(input_df[f'{side}_start_time'])
+        metrics, system_lag = asof_lookup(metrics_index, services, start_times,
+                                          mode=join_mode, window=window)
+        mcr, mcr_lag = asof_lookup(mcr_index, services, start_times,
+                                   mode=join_mode, window=window)
+        lookups[side] = {
+            'cpu': metrics['cpu_utilization'],
+            'memory': metrics['memory_utilization'],
+            'system_lag': system_lag,
+            'mcr': mcr['providerrpc_mcr'],
+            'mcr_lag': mcr_lag,
         }
 
-        return output_row
+    # Keep the established column order: dm1/dm2 side by side per metric
+    for metric in ('cpu', 'memory', 'system_lag', 'mcr', 'mcr_lag'):
+        for side in ('dm1', 'dm2'):
+            output_df[f'{side}_{metric}'] = lookups[side][metric]
 
-    except Exception as e:
-        print(f"Error processing row {idx+1}: {str(e)}")
-        return None
+    # Instance-level context needs the instance ids only sibling files carry
+    if context_indexes is not None and {'dminstanceid1', 'dminstanceid2'} <= set(input_df):
+        enrich_instance_context(output_df, input_df, context_indexes,
+                                join_mode=join_mode, window=window)
+
+    return output_df
+
+def enrich_dataframe(input_df, metrics_index, mcr_index, join_mode='nearest',
+                     window=DEFAULT_WINDOW, context_indexes=None):
+    """enrich_columns() returning a DataFrame."""
+    import pandas as pd
+    return pd.DataFrame(enrich_columns(input_df, metrics_index, mcr_index, join_mode=join_mode,
+                                       window=window, context_indexes=context_indexes))
 
-def process_input_csv_optimized(input_csv_path, chunk_size=1000, use_parallel=True, max_workers=None):
-    """Process the input CSV with optimized metrics lookup using existing indexes."""
+def read_csv_columns(input_csv_path):
+    """Read a small CSV into a dict of object arrays without pandas."""
+    with open(input_csv_path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    return {name: np.array([row[i] if i < len(row) else '' for row in rows], dtype=object)
+            for i, name in enumerate(header)}
+
+def write_csv_columns(columns, output_csv_path):
+    """Write a dict of columns the way DataFrame.to_csv would (NaN/None as empty)."""
+    names = list(columns)
+    values = [np.asarray(columns[name]).tolist() for name in names]
+    with open(output_csv_path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(names)
+        for row in zip(*values):
+            writer.writerow(['' if value is None or value != value else value for value in row])
+
+def process_input_csv_optimized(input_csv_path, chunk_size=1000, join_mode='nearest',
+                                window=DEFAULT_WINDOW, instance_context=True, index_base=None,
+                                output_dir='output', fast_path=True, index_server=None):
+    """Process the input CSV with a vectorized as-of join against the columnar indexes."""
     print(f"\nProcessing: {input_csv_path}")
     start_time = time.time()
     
-    # Load pre-built indexes from the predefined locations
-    metrics_index = load_metrics_index()
-    mcr_index = load_mcr_index()
+    # Small inputs: no pandas, and only the queried services' index rows are read
+    small = fast_path and os.path.getsize(input_csv_path) <= SMALL_INPUT_BYTES
+    
+    if index_server:
+        # Map the resident server's shared-memory indexes instead of loading them
+        from index_server import attach_indexes
+        print(f"Attaching to index server at: {index_server}")
+        indexes = attach_indexes(index_server)
+        metrics_index = indexes['metrics']
+        mcr_index = indexes['mcr']
+        context_names = ('instance_metrics', 'instance_mcr', 'node_metrics')
+        context_indexes = None
+        if instance_context and all(name in indexes for name in context_names):
+            context_indexes = {name: indexes[name] for name in context_names}
+    else:
+        if small:
+            print("Small input: using memory-mapped index slices")
+        # Load pre-built indexes from the predefined (or re-rooted) locations
+        metrics_index = load_metrics_index(index_path(METRICS_INDEX_PATH, index_base), slices=small)
+        mcr_index = load_mcr_index(index_path(MCR_INDEX_PATH, index_base), slices=small)
+        context_indexes = load_context_indexes(index_base, slices=small) if instance_context else None
     
     # Read input CSV
     try:
-        input_df = pd.read_csv(input_csv_path)
-        total_rows = len(input_df)
+        if small:
+            input_df = read_csv_columns(input_csv_path)
+        else:
+            import pandas as pd
+            input_df = pd.read_csv(input_csv_path)
+        total_rows = len(input_df['um'])
         print(f"Read input CSV with {total_rows} rows")
     except Exception as e:
         print(f"Error reading input CSV: {str(e)}")
         return
     
     # Generate output filename
-    unique_ums = input_df['um'].unique()
-    if len(unique_ums) > 0:
+    if total_rows > 0:
         # Use the first um value for the filename
-        first_um = unique_ums[0]
+        first_um = input_df['um'][0]
         output_csv_name = f"contextual_{first_um}.csv"
     else:
         output_csv_name = "contextual_unknown_um.csv"
     
-    output_csv_path = os.path.join('output', output_csv_name)
+    output_csv_path = os.path.join(output_dir, output_csv_name)
     os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
     
-    # Function to write chunks to CSV
-    def write_chunk(data_chunk, is_first_chunk):
-        if not data_chunk:
-            return
-        
-        mode = 'w' if is_first_chunk else 'a'
-        header = is_first_chunk
-        
-        chunk_df = pd.DataFrame(data_chunk)
-        chunk_df.to_csv(output_csv_path, mode=mode, header=header, index=False)
-        print(f"Wrote {len(chunk_df)} rows to {output_csv_path}")
-    
-    # Determine if we should use parallel processing
-    use_parallel = use_parallel and total_rows > 10
-    
-    if not max_workers:
-        max_workers = min(mp.cpu_count(), total_rows)
+    print(f"Joining {total_rows} rows ({join_mode} mode, {window / 1000:.0f}s window)...")
+    output_columns = enrich_columns(input_df, metrics_index, mcr_index,
+                                    join_mode=join_mode, window=window,
+                                    context_indexes=context_indexes)
     
-    # Process in sequential mode
-    if not use_parallel:
-        print(f"Processing {total_rows} rows sequentially...")
-        is_first_chunk = True
-        current_chunk = []
-        
-        for idx, row in input_df.iterrows():
-            if idx % 10 == 0:  # Print progress every 10 rows
-                print(f"Processing row {idx+1}/{total_rows} ({idx/total_rows*100:.1f}%)")
-            
-            args = (idx, row, metrics_index, mcr_index)
-            result = process_row_optimized(args)
-            
-            if result:
-                current_chunk.append(result)
-                
-                # Write chunk if we've reached chunk_size
-                if len(current_chunk) >= chunk_size:
-                    write_chunk(current_chunk, is_first_chunk)
-                    is_first_chunk = False
-                    current_chunk = []
-        
-        # Write any remaining rows
-        if current_chunk:
-            write_chunk(current_chunk, is_first_chunk)
+    matched = np.count_nonzero(~np.isnan(output_columns['dm1_system_lag']))
+    print(f"Matched metrics for {matched}/{total_rows} rows")
     
-    # Process in parallel mode with chunked writing
+    if small:
+        write_csv_columns(output_columns, output_csv_path)
     else:
-        print(f"Processing {total_rows} rows in parallel with {max_workers} workers...")
-        is_first_chunk = True
-        
-        # Create chunks of the input dataframe to process in batches
-        chunk_count = (total_rows + chunk_size - 1) // chunk_size
-        
-        for chunk_idx in range(chunk_count):
-            start_idx = chunk_idx * chunk_size
-            end_idx = min(start_idx + chunk_size, total_rows)
-            
-            print(f"Processing chunk {chunk_idx+1}/{chunk_count} (rows {start_idx+1}-{end_idx})")
-            
-            # Get current chunk of data
-            chunk_df = input_df.iloc[start_idx:end_idx]
-            
-            # Prepare arguments for parallel processing
-            args_list = [(idx, row, metrics_index, mcr_index) 
-                         for idx, row in enumerate(chunk_df.to_dict('records'), start=start_idx)]
-            
-            # Process this chunk in parallel
-            results = []
-            with ProcessPoolExecutor(max_workers=max_workers) as executor:
-                for result in executor.map(process_row_optimized, args_list):
-                    if result:
-                        results.append(result)
-            
-            # Write results from this chunk
-            if results:
-                write_chunk(results, is_first_chunk)
-                is_first_chunk = False
+        pd.DataFrame(output_columns).to_csv(output_csv_path, index=False, chunksize=chunk_size)
+    print(f"Wrote {total_rows} rows to {output_csv_path}")
     
     elapsed_time = time.time() - start_time
     print(f"Completed in {elapsed_time:.2f} seconds.")
@@ -289,28 +254,44 @@ def main():
     parser = argparse.ArgumentParser(description='Gather contextual metrics for microservices.')
     parser.add_argument('input_csv', help='Path to input CSV file')
     parser.add_argument('--chunk-size', type=int, default=1000, 
-                        help='Number of rows to process before writing to CSV')
-    parser.add_argument('--sequential', action='store_true',
-                        help='Force sequential processing (no parallelism)')
-    parser.add_argument('--max-workers', type=int, default=None,
-                        help='Maximum number of worker processes (default: auto)')
+                        help='Number of rows per CSV write batch')
+    parser.add_argument('--join-mode', choices=JOIN_MODES, default='nearest',
+                        help='As-of join semantics: nearest sample, backward/forward only, '
+                             'or linear interpolation between neighbouring samples')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help='Maximum distance in ms between a call and a usable sample '
+                             '(default: 5 intervals)')
+    parser.add_argument('--no-instance-context', action='store_true',
+                        help='Skip per-instance and per-node enrichment')
+    parser.add_argument('--index-base', default=INDEX_BASE,
+                        help='Folder containing the MSMetrics/MSRTMCR/NodeMetrics indexes')
+    parser.add_argument('--output-dir', default='output', help='Output directory')
+    parser.add_argument('--no-fast-path', action='store_true',
+                        help='Always load the full indexes, even for small inputs')
+    parser.add_argument('--index-server', metavar='SOCKET',
+                        help='Use the indexes of a running index_server.py instead of loading them')
     
     args = parser.parse_args()
     
     print("\nCONTEXTUAL METRICS GATHERING TOOL (OPTIMIZED VERSION)")
     print(f"Input CSV: {args.input_csv}")
-    print(f"Output Directory: output/")
-    print(f"Using 10-minute search window (5 intervals before and after)")
-    print(f"Using pre-built indexes from output/data/MSMetrics/index.pkl and output/data/MSRTMCR/index.pkl")
+    print(f"Output Directory: {args.output_dir}/")
+    print(f"Join mode: {args.join_mode}, search window: {args.window} ms")
+    print(f"Using pre-built indexes from {index_path(METRICS_INDEX_PATH, args.index_base)} "
+          f"and {index_path(MCR_INDEX_PATH, args.index_base)}")
     print(f"Chunk size: {args.chunk_size} rows")
-    print(f"Parallel processing: {'No' if args.sequential else 'Yes'}")
     
     process_input_csv_optimized(
         args.input_csv, 
         chunk_size=args.chunk_size,
-        use_parallel=not args.sequential,
-        max_workers=args.max_workers
+        join_mode=args.join_mode,
+        window=args.window,
+        instance_context=not args.no_instance_context,
+        index_base=args.index_base,
+        output_dir=args.output_dir,
+        fast_path=not args.no_fast_path,
+        index_server=args.index_server
     )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
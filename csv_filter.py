@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+import argparse
 
 def preprocess_msrtmcr(input_folder='output/data/MSRTMCR', output_folder='output/data/MSRTMCR_cleaned'):
     # Columns to retain
@@ -23,4 +24,8 @@ def preprocess_msrtmcr(input_folder='output/data/MSRTMCR', output_folder='output
             print(f"Processed: {filename}")
 
 if __name__ == "__main__":
-    preprocess_msrtmcr()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Keep only the MSRTMCR columns used downstream')
+    parser.add_argument('--input-folder', default='output/data/MSRTMCR')
+    parser.add_argument('--output-folder', default='output/data/MSRTMCR_cleaned')
+    args = parser.parse_args()
+    preprocess_msrtmcr(args.input_folder, args.output_folder)
\ No newline at end of file
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Sorted run files and k-way merging for data larger than memory.
+
+Rows are lists of strings stored as CSV (no header). A run is written
+already sorted; merge_runs() streams the union of many runs in key order
+with heapq.merge, first combining runs in passes of at most `fan_in` files
+so the number of open files stays bounded.
+"""
+
+import os
+import csv
+import heapq
+import tempfile
+
+
+def write_run(rows, key, run_dir, prefix='run'):
+    """Sort rows by key and write them to a new run file; returns its path"""
+    rows.sort(key=key)
+    fd, path = tempfile.mkstemp(prefix=f'{prefix}_', suffix='.csv', dir=run_dir)
+    with os.fdopen(fd, 'w', newline='') as f:
+        csv.writer(f, lineterminator='\n').writerows(rows)
+    return path
+
+
+def read_run(path):
+    """Stream the rows of a run file"""
+    with open(path, newline='') as f:
+        yield from csv.reader(f)
+
+
+def merge_runs(paths, key, run_dir, fan_in=256, remove=True):
+    """Yield the rows of all runs in key order (stable across runs in `paths` order)"""
+    paths = list(paths)
+    while len(paths) > fan_in:
+        merged = []
+        for start in range(0, len(paths), fan_in):
+            group = paths[start:start + fan_in]
+            fd, path = tempfile.mkstemp(prefix='merge_', suffix='.csv', dir=run_dir)
+            with os.fdopen(fd, 'w', newline='') as f:
+                csv.writer(f, lineterminator='\n').writerows(
+                    heapq.merge(*(read_run(p) for p in group), key=key))
+            if remove:
+                for p in group:
+                    os.remove(p)
+            merged.append(path)
+        paths = merged
+
+    yield from heapq.merge(*(read_run(p) for p in paths), key=key)
+    if remove:
+        for p in paths:
+            os.remove(p)
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Resident index server: loads the columnar metric indexes once into shared
+memory and serves them over a local Unix socket.
+
+Protocol: one JSON object per line in each direction.
+    {"op": "describe"}   shared-memory block names, dtypes and shapes of
+                         every array (the sorted key table included) plus
+                         the label vocabularies of every index
+    {"op": "lookup", "index": "metrics", "keys": [...], "timestamps": [...],
+     "mode": "nearest", "window": 300000, "columns": null}
+                         batched asof_lookup run by the server
+    {"op": "reload"}     load the indexes again into new blocks (old blocks
+                         stay valid for attached clients until they detach)
+
+Clients normally call attach_indexes(), which maps the blocks read-only
+and runs asof_lookup locally with no copy, so a job's index load cost is
+one describe round trip whose size does not grow with the number of keys.
+Server-side lookups pin the current generation and run without holding
+the lock; a reload releases the blocks of the generation it replaces only
+once the last lookup pinning it has finished.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import argparse
+import threading
+import contextlib
+import socketserver
+import numpy as np
+from multiprocessing import shared_memory
+
+from asof_join import DEFAULT_WINDOW, asof_lookup, build_key_table, load_columnar_index
+
+DEFAULT_SOCKET = 'output/index_server.sock'
+# Index name -> directory under the data folder (see build_index.py)
+INDEX_DIRS = {
+    'metrics': os.path.join('MSMetrics', 'columnar_msname'),
+    'mcr': os.path.join('MSRTMCR', 'columnar_msname'),
+    'instance_metrics': os.path.join('MSMetrics', 'columnar_msinstanceid'),
+    'instance_mcr': os.path.join('MSRTMCR', 'columnar_msinstanceid'),
+    'node_metrics': os.path.join('NodeMetrics', 'columnar_nodeid'),
+}
+
+
+def array_fields(index):
+    """(field, array) pairs of an index that live in shared memory"""
+    fields = [('key_table', index['key_table']), ('offsets', index['offsets']),
+              ('timestamp', index['timestamp']), ('sort_key', index['sort_key'])]
+    fields += [(f'values/{col}', data) for col, data in index['values'].items()]
+    fields += [(f'label_codes/{col}', data) for col, data in index['label_codes'].items()]
+    return fields
+
+
+def set_field(index, field, data):
+    """Replace the array behind an array_fields() name"""
+    if '/' in field:
+        group, col = field.split('/', 1)
+        index[group][col] = data
+    else:
+        index[field] = data
+
+
+def release_blocks(blocks):
+    """Unlink and close blocks; views the server still holds keep their mapping until dropped"""
+    for block in blocks:
+        block.unlink()
+        try:
+            block.close()
+        except BufferError:
+            pass
+
+
+class Generation:
+    def __init__(self, number=0, indexes=None, blocks=None, description=None):
+        """One loaded set of indexes and the blocks backing them"""
+        self.number = number
+        self.indexes = indexes or {}
+        self.blocks = blocks or []
+        self.description = description or {}
+        # Lookups currently reading this generation, and whether a reload replaced it
+        self.users = 0
+        self.retired = False
+
+
+class SharedIndexes:
+    def __init__(self, index_base='output/data'):
+        """Columnar indexes copied into named shared-memory blocks"""
+        self.index_base = index_base
+        self.current = Generation()
+        # Guards the current generation and the users/retired counters
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def use(self):
+        """Pin the current generation so a reload cannot release it while in use"""
+        with self.lock:
+            current = self.current
+            current.users += 1
+        try:
+            yield current
+        finally:
+            with self.lock:
+                current.users -= 1
+                unused = current.retired and current.users == 0
+            if unused:
+                release_blocks(current.blocks)
+
+    def load(self):
+        """
+        Load every available index into a fresh generation of blocks and swap
+        it in. The old generation's blocks are released right away if no
+        lookup is using it, else by the last lookup to finish with it.
+        """
+        started = time.time()
+        generation = self.current.number + 1
+        indexes, blocks, description = {}, [], {}
+        for name, rel_path in INDEX_DIRS.items():
+            path = os.path.join(self.index_base, rel_path)
+            if not os.path.exists(path):
+                print(f"Index not found, not served: {path}")
+                continue
+            index = load_columnar_index(path)
+            index['key_table'] = build_key_table(index['keys'])
+            arrays = {}
+            for i, (field, data) in enumerate(array_fields(index)):
+                data = np.ascontiguousarray(data)
+                block = shared_memory.SharedMemory(
+                    create=True, size=max(data.nbytes, 1),
+                    name=f"ix{os.getpid()}g{generation}_{name}_{i}")
+                view = np.ndarray(data.shape, dtype=data.dtype, buffer=block.buf)
+                view[:] = data
+                # Serve lookups from the shared copy so the index is held only once
+                set_field(index, field, view)
+                blocks.append(block)
+                arrays[field] = {'shm': block.name, 'dtype': data.dtype.str, 'shape': list(data.shape)}
+            description[name] = {
+                'path': path,
+                'key_column': index['key_column'],
+                'value_columns': index['value_columns'],
+                'key_count': len(index['keys']),
+                'labels': {col: values[:-1].tolist() for col, values in index['labels'].items()},
+                'arrays': arrays,
+            }
+            indexes[name] = index
+            print(f"Loaded {name}: {len(index['keys']):,} keys, {len(index['timestamp']):,} samples")
+
+        with self.lock:
+            old = self.current
+            self.current = Generation(generation, indexes, blocks, description)
+            old.retired = True
+            unused = old.users == 0
+        # Unlinking only removes the names; attached clients keep their mappings
+        if unused:
+            release_blocks(old.blocks)
+        print(f"Generation {generation} ready in {time.time() - started:.2f} seconds")
+
+    def close(self):
+        with self.lock:
+            current, self.current = self.current, Generation()
+        release_blocks(current.blocks)
+
+
+class IndexRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except Exception as e:
+                response = {'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class IndexServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, shared):
+        self.shared = shared
+        # Guards the request counter
+        self.lock = threading.Lock()
+        # Serializes reloads, which build the next generation without holding any lock
+        self.reload_lock = threading.Lock()
+        self.requests = 0
+        super().__init__(socket_path, IndexRequestHandler)
+
+    def dispatch(self, message):
+        op = message.get('op')
+        with self.lock:
+            self.requests += 1
+        if op == 'describe':
+            current = self.shared.current
+            return {'generation': current.number, 'indexes': current.description}
+        if op == 'lookup':
+            with self.shared.use() as current:
+                index = current.indexes[message['index']]
+                values, lag = asof_lookup(index, message['keys'], message['timestamps'],
+                                          mode=message.get('mode', 'nearest'),
+                                          window=message.get('window', DEFAULT_WINDOW),
+                                          columns=message.get('columns'))
+                return {'values': {col: data.tolist() for col, data in values.items()},
+                        'lag': lag.tolist()}
+        if op == 'reload':
+            with self.reload_lock:
+                self.shared.load()
+            return {'generation': self.shared.current.number}
+        if op == 'stats':
+            current = self.shared.current
+            return {'generation': current.number, 'requests': self.requests,
+                    'indexes': sorted(current.indexes)}
+        raise ValueError(f"Unknown op '{op}'")
+
+
+def request(socket_path, message):
+    """Send one request to the server and return its decoded response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            response = json.loads(f.readline())
+    if 'error' in response:
+        raise RuntimeError(f"Index server error: {response['error']}")
+    return response
+
+
+def attach_block(name):
+    """Attach to an existing block without letting this process unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached blocks with the resource tracker
+        from multiprocessing import resource_tracker
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+def attach_indexes(socket_path=DEFAULT_SOCKET, attempts=3):
+    """Map the server's indexes read-only, in the dict layout asof_lookup expects"""
+    for attempt in range(attempts):
+        try:
+            return attach_generation(request(socket_path, {'op': 'describe'})['indexes'])
+        except FileNotFoundError:
+            # A reload released the described generation before we mapped it
+            if attempt == attempts - 1:
+                raise
+
+
+def attach_generation(description):
+    """Map the blocks of one described generation"""
+    indexes = {}
+    for name, desc in description.items():
+        blocks = []
+        arrays = {}
+        for field, spec in desc['arrays'].items():
+            block = attach_block(spec['shm'])
+            blocks.append(block)
+            data = np.ndarray(tuple(spec['shape']), dtype=np.dtype(spec['dtype']), buffer=block.buf)
+            data.flags.writeable = False
+            arrays[field] = data
+        indexes[name] = {
+            'path': desc['path'],
+            'key_column': desc['key_column'],
+            'value_columns': desc['value_columns'],
+            # Sorted key names, searched in place by asof_join.encode_keys
+            'key_table': arrays['key_table'],
+            'offsets': arrays['offsets'],
+            'timestamp': arrays['timestamp'],
+            'sort_key': arrays['sort_key'],
+            'values': {col: arrays[f'values/{col}'] for col in desc['value_columns']},
+            'labels': {col: np.array(values + [None], dtype=object) for col, values in desc['labels'].items()},
+            'label_codes': {col: arrays[f'label_codes/{col}'] for col in desc['labels']},
+            # Keeps the mappings alive as long as the index is referenced
+            'blocks': blocks,
+        }
+    return indexes
+
+
+def remote_lookup(socket_path, index, keys, timestamps, mode='nearest', window=DEFAULT_WINDOW, columns=None):
+    """asof_lookup executed by the server; returns (values, lag) like asof_lookup"""
+    response = request(socket_path, {
+        'op': 'lookup', 'index': index, 'keys': [str(key) for key in keys],
+        'timestamps': [float(ts) for ts in timestamps], 'mode': mode, 'window': window,
+        'columns': columns,
+    })
+    # Label columns come back as strings (None where unmatched)
+    values = {col: np.array(data, dtype=object if any(v is None or isinstance(v, str) for v in data)
+                            else np.float64)
+              for col, data in response['values'].items()}
+    return values, np.array(response['lag'], dtype=np.float64)
+
+
+def serve(socket_path=DEFAULT_SOCKET, index_base='output/data'):
+    """Load the indexes and serve until interrupted"""
+    shared = SharedIndexes(index_base)
+    shared.load()
+    if not shared.current.indexes:
+        raise ValueError(f"No indexes found under {index_base}")
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+    server = IndexServer(socket_path, shared)
+    # serve_forever exits cleanly on SIGTERM as well as Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"Serving {', '.join(shared.current.indexes)} on {socket_path}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        shared.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("Index server stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the columnar metric indexes from shared memory')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Unix socket path')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='Load the indexes and serve them')
+    serve_parser.add_argument('--index-base', default='output/data',
+                              help='Folder containing the MSMetrics/MSRTMCR/NodeMetrics indexes')
+    subparsers.add_parser('stats', help='Show server statistics')
+    subparsers.add_parser('reload', help='Reload the indexes from disk')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket, args.index_base)
+    else:
+        print(json.dumps(request(args.socket, {'op': args.command})))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
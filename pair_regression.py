@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Batch logistic regression of execution order on dm1 load for every group.
+
+Loads the enriched contextual_<um>.csv data once, builds one feature matrix
+sorted by group, publishes it through shared memory and fits one
+LogisticRegression per (dm1, dm2) pair or (um, dm1, dm2) group in a process
+pool. Workers only receive (start, end) row ranges, never the data itself.
+
+The target is 1 for concurrent and 0 for sequential, so a positive
+coefficient means higher load goes with more concurrency. Features are
+standardized per group; coefficients are per standard deviation.
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+from pair_statistics import load_contextual_frame
+
+FEATURES = ['dm1_system_load', 'dm1_mcr']
+GROUP_KEYS = {
+    'pair': ['dm1', 'dm2'],
+    'um': ['um', 'dm1', 'dm2'],
+}
+
+# Shared feature matrix, attached once per worker process
+_shared = {}
+
+
+def load_feature_frame(contextual_files, keys=GROUP_KEYS['um']):
+    """Load contextual files and keep the rows usable for regression."""
+    df = load_contextual_frame(contextual_files, extra_columns=['um'])
+    if df is None:
+        return None
+    df = df[df['execution_order'].isin(['concurrent', 'sequential'])]
+    # groupby drops NaN keys; keeping them would break the contiguous group ranges below
+    return df.dropna(subset=FEATURES + list(keys))
+
+
+def attach_shared_features(x_name, y_name, n_rows):
+    """Worker initializer: map the shared X and y arrays read-only."""
+    x_shm = shared_memory.SharedMemory(name=x_name)
+    y_shm = shared_memory.SharedMemory(name=y_name)
+    X = np.ndarray((n_rows, len(FEATURES)), dtype=np.float64, buffer=x_shm.buf)
+    y = np.ndarray((n_rows,), dtype=np.int8, buffer=y_shm.buf)
+    X.flags.writeable = False
+    y.flags.writeable = False
+    # Keep the SharedMemory handles alive as long as the arrays
+    _shared.update(x_shm=x_shm, y_shm=y_shm, X=X, y=y)
+
+
+def fit_group(task):
+    """Fit one group's model on rows [start, end) of the shared matrix."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    group_id, start, end, min_rows = task
+    X = _shared['X'][start:end]
+    y = _shared['y'][start:end]
+    result = {'group_id': group_id, 'n': end - start, 'n_concurrent': int(y.sum())}
+
+    if end - start < min_rows:
+        result['status'] = 'too_few_rows'
+        return result
+    if result['n_concurrent'] in (0, end - start):
+        result['status'] = 'single_class'
+        return result
+
+    fit_start = time.perf_counter()
+    X_scaled = StandardScaler().fit_transform(X)
+    model = LogisticRegression()
+    model.fit(X_scaled, y)
+    result['fit_seconds'] = time.perf_counter() - fit_start
+
+    result['intercept'] = model.intercept_[0]
+    for feature, coef in zip(FEATURES, model.coef_[0]):
+        result[f'coef_{feature}'] = coef
+        result[f'odds_ratio_{feature}'] = np.exp(coef)
+    result['accuracy'] = model.score(X_scaled, y)
+    result['status'] = 'ok'
+    return result
+
+
+def run_batch_regression(contextual_files, group_by='pair', output_csv='output/res/pair_regression.csv',
+                         min_rows=20, max_workers=None):
+    """Fit one model per group and write the coefficient and benchmark tables."""
+    start_time = time.time()
+    keys = GROUP_KEYS[group_by]
+
+    df = load_feature_frame(contextual_files, keys)
+    if df is None or df.empty:
+        print("No valid rows for regression.")
+        return None
+
+    # Sort once so each group is a contiguous row range
+    df = df.sort_values(keys, kind='stable').reset_index(drop=True)
+    groups = df.groupby(keys, sort=False).size()
+    ends = np.cumsum(groups.values)
+    starts = ends - groups.values
+    load_seconds = time.time() - start_time
+    print(f"Loaded {len(df):,} rows in {len(groups):,} groups in {load_seconds:.2f} seconds")
+
+    X = np.ascontiguousarray(df[FEATURES].values, dtype=np.float64)
+    y = (df['execution_order'].values == 'concurrent').astype(np.int8)
+
+    x_shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+    y_shm = shared_memory.SharedMemory(create=True, size=max(y.nbytes, 1))
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=x_shm.buf)[:] = X
+        np.ndarray(y.shape, dtype=y.dtype, buffer=y_shm.buf)[:] = y
+
+        tasks = [(i, int(s), int(e), min_rows) for i, (s, e) in enumerate(zip(starts, ends))]
+        # Largest groups first so stragglers do not dominate the wall time
+        tasks.sort(key=lambda task: task[2] - task[1], reverse=True)
+
+        fit_start = time.time()
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=attach_shared_features,
+                                 initargs=(x_shm.name, y_shm.name, len(y))) as executor:
+            results = list(executor.map(fit_group, tasks, chunksize=16))
+        fit_wall = time.time() - fit_start
+    finally:
+        x_shm.close()
+        x_shm.unlink()
+        y_shm.close()
+        y_shm.unlink()
+
+    results_df = pd.DataFrame(results).sort_values('group_id')
+    group_index = groups.index.to_frame(index=False)
+    results_df = pd.concat([group_index, results_df.drop(columns='group_id').reset_index(drop=True)], axis=1)
+
+    os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+    results_df.to_csv(output_csv, index=False)
+
+    fitted = results_df['status'] == 'ok'
+    benchmark = pd.DataFrame([{
+        'group_by': group_by,
+        'rows': len(df),
+        'groups': len(groups),
+        'groups_fitted': int(fitted.sum()),
+        'workers': max_workers or os.cpu_count(),
+        'load_seconds': load_seconds,
+        'fit_wall_seconds': fit_wall,
+        'fit_cpu_seconds': results_df.get('fit_seconds', pd.Series(dtype=float)).sum(),
+        'groups_per_second': len(groups) / fit_wall if fit_wall > 0 else np.nan,
+    }])
+    benchmark_csv = os.path.splitext(output_csv)[0] + '_benchmark.csv'
+    benchmark.to_csv(benchmark_csv, index=False)
+
+    print(f"\nFitted {fitted.sum():,}/{len(groups):,} groups in {fit_wall:.2f} seconds")
+    print(f"Saved coefficients to {output_csv}")
+    print(f"Saved benchmark to {benchmark_csv}")
+    return results_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch logistic regression of execution order on dm1 load')
+    parser.add_argument('contextual_csv', nargs='+', help='contextual_<um>.csv files')
+    parser.add_argument('--group-by', choices=sorted(GROUP_KEYS), default='pair',
+                        help='Fit one model per (dm1, dm2) pair or per (um, dm1, dm2) group')
+    parser.add_argument('--output', default='output/res/pair_regression.csv',
+                        help='Path of the coefficient table')
+    parser.add_argument('--min-rows', type=int, default=20,
+                        help='Skip groups with fewer rows than this')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Maximum number of worker processes (default: auto)')
+    args = parser.parse_args()
+
+    run_batch_regression(
+        args.contextual_csv,
+        group_by=args.group_by,
+        output_csv=args.output,
+        min_rows=args.min_rows,
+        max_workers=args.max_workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Batched causal screening of every sibling pair in one pass.
+
+Builds the um x execution_order contingency table of every (dm1, dm2) pair
+from output/siblings, runs chi-square (vectorized across all pairs), Fisher
+exact (2x2 tables, in a process pool) and optional Mann-Whitney U tests on
+contextual load/MCR (vectorized ranks), then writes a single results table
+with multiple-testing corrected p-values.
+"""
+
+import os
+import glob
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+
+PAIR_KEY = ['dm1', 'dm2']
+
+
+def count_execution_orders(csv_file):
+    """Count execution orders per (dm1, dm2, um) in one sibling file."""
+    columns = {'um', 'dm1', 'dm2', 'execution_order', 'multiplicity', 'concurrent', 'sequential'}
+    try:
+        df = pd.read_csv(csv_file, usecols=lambda name: name in columns)
+    except Exception as e:
+        print(f"Error processing {csv_file}: {e}")
+        return None
+    if 'multiplicity' in df.columns:
+        # Compact rows carry the tallies of every pair they collapse
+        counts = df.groupby(PAIR_KEY + ['um'])[['concurrent', 'sequential']].sum()
+        return counts.rename_axis(columns='execution_order')
+    counts = df.groupby(PAIR_KEY + ['um', 'execution_order']).size()
+    return counts.unstack('execution_order', fill_value=0)
+
+
+def build_contingency_tables(sibling_files, max_workers=None):
+    """Build every pair's um x execution_order table as one long DataFrame."""
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        partials = [p for p in executor.map(count_execution_orders, sibling_files, chunksize=64)
+                    if p is not None]
+
+    if not partials:
+        return pd.DataFrame(columns=PAIR_KEY + ['um', 'concurrent', 'sequential'])
+
+    tables = pd.concat(partials).fillna(0)
+    for order in ('concurrent', 'sequential'):
+        if order not in tables.columns:
+            tables[order] = 0
+    # A pair split over several files (e.g. appended runs) is summed here
+    tables = tables.groupby(level=[0, 1, 2])[['concurrent', 'sequential']].sum()
+    return tables.astype(np.int64).reset_index()
+
+
+def adjust_pvalues(pvalues, method='fdr_bh'):
+    """Multiple-testing correction over all non-NaN p-values."""
+    p = np.asarray(pvalues, dtype=np.float64)
+    adjusted = np.full(p.shape, np.nan)
+    mask = ~np.isnan(p)
+    m = mask.sum()
+    if m == 0:
+        return adjusted
+
+    values = p[mask]
+    if method == 'bonferroni':
+        adjusted[mask] = np.minimum(values * m, 1.0)
+    elif method == 'fdr_bh':
+        # Benjamini-Hochberg step-up: p_(i) * m / i, made monotone from the top
+        order = np.argsort(values)
+        ranked = values[order] * m / np.arange(1, m + 1)
+        ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+        result = np.empty(m)
+        result[order] = np.minimum(ranked, 1.0)
+        adjusted[mask] = result
+    else:
+        raise ValueError(f"Unknown correction method '{method}'")
+    return adjusted
+
+
+def chi_square_tests(tables):
+    """Chi-square test of um vs execution_order for every pair at once."""
+    observed = tables[['concurrent', 'sequential']].values.astype(np.float64)
+    pair_ids = tables.groupby(PAIR_KEY, sort=False).ngroup().values
+    n_pairs = pair_ids.max() + 1 if len(pair_ids) else 0
+
+    row_totals = observed.sum(axis=1)
+    col_totals = np.zeros((n_pairs, 2))
+    np.add.at(col_totals, pair_ids, observed)
+    grand_totals = col_totals.sum(axis=1)
+    num_ums = np.bincount(pair_ids, minlength=n_pairs)
+
+    expected = row_totals[:, None] * col_totals[pair_ids] / grand_totals[pair_ids, None]
+    dof = (num_ums - 1) * ((col_totals > 0).sum(axis=1) - 1)
+
+    # Yates' continuity correction for 1-dof tables, as in chi2_contingency
+    diff = expected - observed
+    yates = (dof == 1)[pair_ids]
+    adjusted = np.where(yates[:, None],
+                        observed + np.sign(diff) * np.minimum(0.5, np.abs(diff)),
+                        observed)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cells = np.where(expected > 0, (adjusted - expected) ** 2 / expected, 0.0)
+    chi2 = np.zeros(n_pairs)
+    np.add.at(chi2, pair_ids, cells.sum(axis=1))
+
+    pvalues = np.where(dof > 0, stats.chi2.sf(chi2, np.maximum(dof, 1)), np.nan)
+    chi2 = np.where(dof > 0, chi2, np.nan)
+
+    first_rows = tables.drop_duplicates(subset=PAIR_KEY)[PAIR_KEY].reset_index(drop=True)
+    return first_rows.assign(
+        num_ums=num_ums,
+        num_concurrent=col_totals[:, 0].astype(np.int64),
+        num_sequential=col_totals[:, 1].astype(np.int64),
+        total_observations=grand_totals.astype(np.int64),
+        chi2=chi2,
+        chi2_dof=dof,
+        chi2_p=pvalues,
+    )
+
+
+def fisher_exact_table(table):
+    """Fisher exact test on one flattened 2x2 table."""
+    oddsratio, p_value = stats.fisher_exact(np.asarray(table).reshape(2, 2))
+    return oddsratio, p_value
+
+
+def fisher_tests(tables, max_workers=None):
+    """Fisher exact test for every pair whose table is exactly 2x2."""
+    two_um = tables.groupby(PAIR_KEY, sort=False)['um'].transform('size') == 2
+    subset = tables[two_um]
+    if subset.empty:
+        return pd.DataFrame(columns=PAIR_KEY + ['fisher_odds_ratio', 'fisher_p'])
+
+    flat = subset[['concurrent', 'sequential']].values.reshape(-1, 4)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(fisher_exact_table, flat, chunksize=256))
+
+    pairs = subset[PAIR_KEY].iloc[::2].reset_index(drop=True)
+    pairs['fisher_odds_ratio'] = [r[0] for r in results]
+    pairs['fisher_p'] = [r[1] for r in results]
+    return pairs
+
+
+def mann_whitney_tests(df, value_column, prefix):
+    """
+    Two-sided Mann-Whitney U (concurrent vs sequential) for every pair at once.
+
+    Uses the normal approximation with tie and continuity correction, computed
+    from grouped ranks so all pairs share a single sort.
+    """
+    df = df.dropna(subset=[value_column, 'execution_order'])
+    df = df[df['execution_order'].isin(['concurrent', 'sequential'])]
+    if df.empty:
+        return pd.DataFrame(columns=PAIR_KEY + [f'{prefix}_u', f'{prefix}_p'])
+
+    is_concurrent = (df['execution_order'] == 'concurrent').astype(np.float64)
+    ranks = df.groupby(PAIR_KEY)[value_column].rank(method='average')
+    grouped = pd.DataFrame({
+        'dm1': df['dm1'], 'dm2': df['dm2'],
+        'n1': is_concurrent, 'rank_sum': ranks * is_concurrent,
+    }).groupby(PAIR_KEY)
+    summary = grouped.agg(n1=('n1', 'sum'), n=('n1', 'size'), rank_sum=('rank_sum', 'sum'))
+
+    # Sum of (t^3 - t) over tied groups of each pair
+    ties = df.groupby(PAIR_KEY + [value_column]).size().astype(np.float64)
+    summary['tie_term'] = (ties ** 3 - ties).groupby(level=[0, 1]).sum()
+
+    n1 = summary['n1'].values
+    n = summary['n'].values.astype(np.float64)
+    n2 = n - n1
+    u1 = summary['rank_sum'].values - n1 * (n1 + 1) / 2
+    mean_u = n1 * n2 / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_u = n1 * n2 / 12 * ((n + 1) - summary['tie_term'].values / (n * (n - 1)))
+        z = (np.abs(u1 - mean_u) - 0.5) / np.sqrt(var_u)
+    testable = (n1 > 0) & (n2 > 0) & (var_u > 0)
+    pvalues = np.where(testable, np.minimum(2 * stats.norm.sf(np.maximum(z, 0)), 1.0), np.nan)
+
+    result = summary.reset_index()[PAIR_KEY]
+    result[f'{prefix}_u'] = np.where(testable, u1, np.nan)
+    result[f'{prefix}_p'] = pvalues
+    return result
+
+
+def load_contextual_frame(contextual_files, extra_columns=()):
+    """Load dm1 load/MCR features (plus extra_columns) from contextual_<um>.csv files."""
+    frames = []
+    for csv_file in contextual_files:
+        try:
+            frames.append(pd.read_csv(csv_file, usecols=list(extra_columns) + PAIR_KEY + [
+                'execution_order', 'dm1_cpu', 'dm1_memory', 'dm1_mcr']))
+        except Exception as e:
+            print(f"Error processing {csv_file}: {e}")
+    if not frames:
+        return None
+
+    df = pd.concat(frames, ignore_index=True)
+    for col in ('dm1_cpu', 'dm1_memory', 'dm1_mcr'):
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['dm1_system_load'] = 0.7 * df['dm1_cpu'] + 0.3 * df['dm1_memory']
+    return df
+
+
+def run_pair_tests(sibling_dir="output/siblings", output_csv="output/res/pair_tests.csv",
+                   contextual_files=(), min_um_count=10, correction='fdr_bh', max_workers=None):
+    """Screen every sibling pair and write one results table."""
+    start_time = time.time()
+    sibling_files = sorted(glob.glob(os.path.join(sibling_dir, "*.csv")))
+    print(f"Found {len(sibling_files)} CSV files in {sibling_dir}")
+
+    tables = build_contingency_tables(sibling_files, max_workers=max_workers)
+    print(f"Built contingency tables: {len(tables):,} (pair, um) rows "
+          f"in {time.time() - start_time:.2f} seconds")
+
+    # Drop UM groups with too few observations, as in the per-pair notebook test
+    tables = tables[tables['concurrent'] + tables['sequential'] >= min_um_count].reset_index(drop=True)
+
+    results = chi_square_tests(tables)
+    results = results.merge(fisher_tests(tables, max_workers=max_workers), on=PAIR_KEY, how='left')
+    test_columns = ['chi2_p', 'fisher_p']
+
+    if contextual_files:
+        contextual = load_contextual_frame(contextual_files)
+        if contextual is not None:
+            for value_column, prefix in (('dm1_system_load', 'load_mwu'), ('dm1_mcr', 'mcr_mwu')):
+                results = results.merge(mann_whitney_tests(contextual, value_column, prefix),
+                                        on=PAIR_KEY, how='left')
+                test_columns.append(f'{prefix}_p')
+
+    for col in test_columns:
+        results[f'{col}_adj'] = adjust_pvalues(results[col].values, method=correction)
+
+    results = results.sort_values('chi2_p', na_position='last')
+    os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+    results.to_csv(output_csv, index=False)
+
+    significant = (results['chi2_p_adj'] < 0.05).sum()
+    print(f"\nScreened {len(results):,} pairs in {time.time() - start_time:.2f} seconds")
+    print(f"Pairs with a significant um/execution_order association ({correction} < 0.05): {significant:,}")
+    print(f"Saved results to {output_csv}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batched statistical tests for all sibling pairs')
+    parser.add_argument('--sibling-dir', default='output/siblings',
+                        help='Directory with sibling_<dm1>_<dm2>.csv files')
+    parser.add_argument('--output', default='output/res/pair_tests.csv',
+                        help='Path of the results table')
+    parser.add_argument('--contextual', nargs='*', default=[],
+                        help='contextual_<um>.csv files for Mann-Whitney load/MCR tests')
+    parser.add_argument('--min-um-count', type=int, default=10,
+                        help='Drop UM groups with fewer observations than this')
+    parser.add_argument('--correction', choices=['fdr_bh', 'bonferroni'], default='fdr_bh',
+                        help='Multiple-testing correction')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Maximum number of worker processes (default: auto)')
+    args = parser.parse_args()
+
+    run_pair_tests(
+        sibling_dir=args.sibling_dir,
+        output_csv=args.output,
+        contextual_files=args.contextual,
+        min_um_count=args.min_um_count,
+        correction=args.correction,
+        max_workers=args.max_workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,29 @@
-
-
 import pandas as pd
 import os
-
-# Input CSV file path
-input_csv = "sibling-for-analysis/sibling_MS_53745_MS_63670.csv"  # Replace with actual input path
+import argparse
+
+parser = argparse.ArgumentParser(description='Split one sibling pair into per-um aggregator files')
+parser.add_argument('--input-csv', default="sibling-for-analysis/sibling_MS_53745_MS_63670.csv",
+                    help='Sibling pair CSV to split')
+parser.add_argument('--store', default=None,
+                    help='Fetch the pair from a sibling store (see sibling_store.py) instead of a CSV')
+parser.add_argument('--dm1', help='First service of the pair (with --store)')
+parser.add_argument('--dm2', help='Second service of the pair (with --store)')
+parser.add_argument('--output-dir', default="aggregator/", help='Output directory')
+args = parser.parse_args()
+if args.store and not (args.dm1 and args.dm2):
+    parser.error("--store requires both --dm1 and --dm2")
 
 # Output directory
-output_dir = "aggregator/"
+output_dir = args.output_dir
 os.makedirs(output_dir, exist_ok=True)
 
-# Read the CSV file
-df = pd.read_csv(input_csv)
+# Read only the pair's byte range from the store, or the whole CSV file
+if args.store:
+    from sibling_store import SiblingStore
+    df = SiblingStore(args.store).query(dm1=args.dm1, dm2=args.dm2)
+else:
+    df = pd.read_csv(args.input_csv)
 
 # Group by 'um'
 for um_value, group in df.groupby("um"):
@@ -27,4 +39,4 @@ for um_value, group in df.groupby("um"):
 
         # Save to CSV
         subset.to_csv(output_path, index=False)
-        print(f"Saved: {output_path}")
\ No newline at end of file
+        print(f"Saved: {output_path}")
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+One-command pipeline over the analysis scripts, with stage caching.
+
+Stages are declared as a DAG of script invocations. Each stage lists the
+files it reads (globs) and the paths it writes; its code is the script plus
+every repository module the script imports. A stage's fingerprint hashes its
+command line, the contents of its code files and the size/mtime of every
+input file. A stage is skipped when its
+fingerprint matches the one recorded in the state file and all of its
+outputs exist. Upstream outputs are downstream inputs, so a rerun stage
+invalidates exactly the stages that consume what it rewrote. Outputs are
+deleted before a stage reruns, so no two stages may declare overlapping
+output paths.
+
+Stages whose dependencies are done run concurrently (e.g. the MSMetrics,
+MSRTMCR and NodeMetrics index builds), each logging to <output>/logs/.
+"""
+
+import os
+import ast
+import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def local_modules(script):
+    """The script plus every repository module it imports, transitively"""
+    seen = []
+    pending = [os.path.join(SCRIPT_DIR, script)]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        # ast.walk also finds the lazy imports inside functions
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                module_path = os.path.join(SCRIPT_DIR, module.split('.')[0] + '.py')
+                if os.path.exists(module_path):
+                    pending.append(module_path)
+    return sorted(seen)
+
+
+def stage(name, script, args, inputs=(), outputs=(), deps=(), optional_outputs=()):
+    """
+    Declare a stage that runs `python <script> <args>`. `outputs` must exist
+    for the stage to count as up to date; `optional_outputs` are only written
+    when there is something to write. Both are deleted before a rerun.
+    """
+    return {
+        'name': name,
+        'command': [sys.executable, os.path.join(SCRIPT_DIR, script)] + list(args),
+        'inputs': list(inputs),
+        'outputs': list(outputs),
+        'optional_outputs': list(optional_outputs),
+        'deps': list(deps),
+        'code': local_modules(script),
+    }
+
+
+def check_outputs(stages):
+    """Reject stages whose outputs overlap: a rerun would delete another stage's files"""
+    owners = {}
+    for name, stage_def in stages.items():
+        for path in stage_def['outputs'] + stage_def['optional_outputs']:
+            owners[os.path.normpath(path)] = name
+    for path, name in owners.items():
+        for other_path, other in owners.items():
+            if other != name and (path == other_path or other_path.startswith(path + os.sep)):
+                raise ValueError(f"Stage '{name}' output {path} overlaps stage '{other}' output {other_path}")
+
+
+def build_stages(callgraph="capser-output-2022/output-rebuild", data="output/data", output="output",
+                 pair=None, compact=False):
+    """The default workflow; pair=(dm1, dm2) adds the per-pair aggregator and contextual stages"""
+    sibling_subdir = "siblings_compact" if compact else "siblings"
+    sibling_dir = os.path.join(output, sibling_subdir)
+    res_dir = os.path.join(output, "res")
+    stages = [
+        stage('index_msmetrics', 'build_index.py', ['--base-path', data, '--msmetrics-only'],
+              inputs=[f'{data}/MSMetrics/*.csv'],
+              outputs=[f'{data}/MSMetrics/columnar_msname', f'{data}/MSMetrics/columnar_msinstanceid']),
+        stage('index_msrtmcr', 'build_index.py', ['--base-path', data, '--msrtmcr-only'],
+              inputs=[f'{data}/MSRTMCR/*.csv'],
+              outputs=[f'{data}/MSRTMCR/columnar_msname', f'{data}/MSRTMCR/columnar_msinstanceid']),
+        stage('index_nodemetrics', 'build_index.py', ['--base-path', data, '--nodemetrics-only'],
+              inputs=[f'{data}/NodeMetrics/*.csv'], outputs=[f'{data}/NodeMetrics/columnar_nodeid']),
+        stage('siblings', 'sibling_identifier.py',
+              [callgraph, '--output-dir', output] + (['--compact'] if compact else []),
+              inputs=[f'{callgraph}/*.csv'], outputs=[sibling_dir]),
+        # res/ is shared with pair_statistics.py and pair_regression.py: declare only this stage's files
+        stage('process_siblings', 'process_siblings.py',
+              ['--sibling-dir', sibling_dir, '--res-dir', res_dir],
+              inputs=[f'{sibling_dir}/*.csv'], outputs=[f'{res_dir}/uncertain'],
+              optional_outputs=[f'{res_dir}/parallel.csv', f'{res_dir}/unknown.csv'], deps=['siblings']),
+    ]
+    if pair is not None:
+        dm1, dm2 = sorted(pair)
+        pair_csv = f'{sibling_dir}/sibling_{dm1}_{dm2}.csv'
+        stages += [
+            stage('aggregator', 'parent_aggregator.py',
+                  ['--input-csv', pair_csv, '--output-dir', f'{output}/aggregator_{dm1}_{dm2}'],
+                  inputs=[pair_csv], outputs=[f'{output}/aggregator_{dm1}_{dm2}'], deps=['siblings']),
+            stage('contextual', 'contextual_gather_optimized.py',
+                  [pair_csv, '--index-base', data, '--output-dir', f'{output}/contextual_{dm1}_{dm2}'],
+                  inputs=[pair_csv, f'{data}/*/columnar_*/*'],
+                  outputs=[f'{output}/contextual_{dm1}_{dm2}'],
+                  deps=['siblings', 'index_msmetrics', 'index_msrtmcr', 'index_nodemetrics']),
+        ]
+    stages = {s['name']: s for s in stages}
+    check_outputs(stages)
+    return stages
+
+
+def fingerprint(stage_def):
+    """Hash of the command, code contents and input file metadata"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(stage_def['command'][1:]).encode('utf-8'))
+    for path in stage_def['code']:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    for pattern in stage_def['inputs']:
+        # Size and mtime instead of content: inputs can be many GB
+        for path in sorted(glob.glob(pattern)):
+            stat = os.stat(path)
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def select_stages(stages, targets):
+    """The requested stages plus everything they depend on"""
+    selected = set()
+    pending = list(targets or stages)
+    while pending:
+        name = pending.pop()
+        if name not in stages:
+            raise ValueError(f"Unknown stage '{name}' (available: {', '.join(stages)})")
+        if name not in selected:
+            selected.add(name)
+            pending.extend(stages[name]['deps'])
+    return [name for name in stages if name in selected]
+
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def save_state(state, state_path):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def run_stage(stage_def, log_dir):
+    """Clear the stage's own outputs (scripts append) and run it, logging to a file"""
+    for path in stage_def['outputs'] + stage_def['optional_outputs']:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    log_path = os.path.join(log_dir, f"{stage_def['name']}.log")
+    started = time.time()
+    with open(log_path, 'w') as log:
+        result = subprocess.run(stage_def['command'], stdout=log, stderr=subprocess.STDOUT, cwd=os.getcwd())
+    return result.returncode, time.time() - started, log_path
+
+
+def run_pipeline(stages, targets=None, state_path="output/.pipeline_state.json", jobs=4,
+                 force=(), dry_run=False):
+    """Run the selected stages in dependency order, skipping up-to-date ones"""
+    order = select_stages(stages, targets)
+    state = load_state(state_path)
+    log_dir = os.path.join(os.path.dirname(state_path) or '.', 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    done, failed = set(), set()
+    running = {}
+    print(f"Pipeline: {len(order)} stages, up to {jobs} in parallel")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            # Start (or skip) every stage whose dependencies are finished
+            for name in order:
+                if len(running) >= jobs:
+                    break
+                if name in done or name in failed or name in running.values():
+                    continue
+                deps = [dep for dep in stages[name]['deps'] if dep in order]
+                if any(dep in failed for dep in deps):
+                    print(f"   ✗ {name}: skipped, dependency failed")
+                    failed.add(name)
+                    continue
+                if not all(dep in done for dep in deps):
+                    continue
+                current = fingerprint(stages[name])
+                up_to_date = (state.get(name, {}).get('fingerprint') == current
+                              and all(os.path.exists(path) for path in stages[name]['outputs']))
+                if up_to_date and name not in force:
+                    print(f"   ✓ {name}: up to date")
+                    done.add(name)
+                    continue
+                if dry_run:
+                    print(f"   • {name}: would run: {' '.join(stages[name]['command'][1:])}")
+                    done.add(name)
+                    continue
+                print(f"   ▶ {name}: running")
+                running[executor.submit(run_stage, stages[name], log_dir)] = name
+
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, elapsed, log_path = future.result()
+                if returncode == 0:
+                    # Fingerprint again: the stage's own inputs may be upstream outputs
+                    state[name] = {'fingerprint': fingerprint(stages[name]), 'finished': time.time(),
+                                   'seconds': round(elapsed, 2)}
+                    save_state(state, state_path)
+                    print(f"   ✓ {name}: done in {elapsed:.2f} seconds ({log_path})")
+                    done.add(name)
+                else:
+                    print(f"   ✗ {name}: failed with exit code {returncode}, see {log_path}")
+                    failed.add(name)
+
+    print(f"Pipeline finished: {len(done)} done, {len(failed)} failed")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the analysis pipeline, skipping up-to-date stages')
+    parser.add_argument('targets', nargs='*', help='Stages to run (with their dependencies); default all')
+    parser.add_argument('--callgraph', default='capser-output-2022/output-rebuild',
+                        help='Folder containing MSCallGraph CSV files')
+    parser.add_argument('--data', default='output/data',
+                        help='Folder containing MSMetrics, MSRTMCR and NodeMetrics')
+    parser.add_argument('--output', default='output', help='Output root')
+    parser.add_argument('--pair', help='DM1,DM2 pair for the aggregator and contextual stages')
+    parser.add_argument('--compact', action='store_true', help='Use compact sibling output')
+    parser.add_argument('--jobs', type=int, default=4, help='Maximum stages running at once')
+    parser.add_argument('--force', nargs='*', default=[], help='Stages to rerun even if up to date')
+    parser.add_argument('--dry-run', action='store_true', help='Only show which stages would run')
+    parser.add_argument('--list', action='store_true', help='List the stages and exit')
+    args = parser.parse_args()
+
+    pair = tuple(args.pair.split(',')) if args.pair else None
+    stages = build_stages(args.callgraph, args.data, args.output, pair=pair, compact=args.compact)
+    if args.list:
+        for name, stage_def in stages.items():
+            deps = ', '.join(stage_def['deps']) or '-'
+            print(f"{name:20s} deps: {deps:60s} {' '.join(stage_def['command'][1:])}")
+        return 0
+
+    ok = run_pipeline(stages, args.targets, state_path=os.path.join(args.output, '.pipeline_state.json'),
+                      jobs=args.jobs, force=set(args.force), dry_run=args.dry_run)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
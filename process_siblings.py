@@ -8,14 +8,15 @@ import pandas as pd
 import os
 import shutil
 import glob
+import argparse
 from pathlib import Path
 
-def process_sibling_files():
-    """Process sibling CSV files and categorize them"""
+def process_sibling_files(sibling_dir="output/siblings", res_dir="output/res"):
+    """Process sibling CSV files (full or compact) and categorize them"""
     
     # Create output directories
-    os.makedirs("output/res", exist_ok=True)
-    os.makedirs("output/res/uncertain", exist_ok=True)
+    os.makedirs(res_dir, exist_ok=True)
+    os.makedirs(os.path.join(res_dir, "uncertain"), exist_ok=True)
     
     # Initialize result dataframes
     parallel_data = []
@@ -26,9 +27,9 @@ def process_sibling_files():
     max_uncertain_observations = 0
     
     # Get all CSV files from siblings directory
-    sibling_files = glob.glob("output/siblings/*.csv")
+    sibling_files = glob.glob(os.path.join(sibling_dir, "*.csv"))
     
-    print(f"Found {len(sibling_files)} CSV files in output/siblings directory")
+    print(f"Found {len(sibling_files)} CSV files in {sibling_dir} directory")
     print("-" * 50)
     
     for csv_file in sibling_files:
@@ -57,23 +58,30 @@ def process_sibling_files():
                 print(f"Warning: Missing required column data in {filename}")
                 continue
             
-            # Get number of observations
-            num_observations = len(df)
-            
-            # Check if execution_order column exists
-            if 'execution_order' not in df.columns:
-                print(f"Warning: No execution_order column in {filename}")
-                continue
-            
-            # Check execution_order values
-            execution_orders = df['execution_order']
-            
-            # Check if all are concurrent
-            all_concurrent = all(order == 'concurrent' for order in execution_orders)
-            
-            # Count sequential and concurrent
-            num_concurrent = sum(1 for order in execution_orders if order == 'concurrent')
-            num_seq = sum(1 for order in execution_orders if order == 'sequential')
+            if 'multiplicity' in df.columns:
+                # Compact rows carry their own pair tallies
+                num_observations = int(df['multiplicity'].sum())
+                num_concurrent = int(df['concurrent'].sum())
+                num_seq = int(df['sequential'].sum())
+                all_concurrent = num_seq == 0
+            else:
+                # Get number of observations
+                num_observations = len(df)
+                
+                # Check if execution_order column exists
+                if 'execution_order' not in df.columns:
+                    print(f"Warning: No execution_order column in {filename}")
+                    continue
+                
+                # Check execution_order values
+                execution_orders = df['execution_order']
+                
+                # Check if all are concurrent
+                all_concurrent = all(order == 'concurrent' for order in execution_orders)
+                
+                # Count sequential and concurrent
+                num_concurrent = sum(1 for order in execution_orders if order == 'concurrent')
+                num_seq = sum(1 for order in execution_orders if order == 'sequential')
             
             # print(f"File: {filename}")
             # print(f"  UM: {um}, DM1: {dm1}, DM2: {dm2}")
@@ -104,7 +112,7 @@ def process_sibling_files():
                     print(f"  → Unknown: {filename} ({num_observations} observations)")
                 else:
                     # Large dataset - copy to uncertain folder
-                    output_path = os.path.join("output/res/uncertain", filename)
+                    output_path = os.path.join(res_dir, "uncertain", filename)
                     shutil.copy2(csv_file, output_path)
                     print(f"  → Uncertain: {filename} ({num_observations} observations)")
                     
@@ -121,16 +129,18 @@ def process_sibling_files():
     # Save parallel.csv
     if parallel_data:
         parallel_df = pd.DataFrame(parallel_data)
-        parallel_df.to_csv("output/res/parallel.csv", index=False)
-        print(f"\nCreated output/res/parallel.csv with {len(parallel_data)} entries")
+        parallel_path = os.path.join(res_dir, "parallel.csv")
+        parallel_df.to_csv(parallel_path, index=False)
+        print(f"\nCreated {parallel_path} with {len(parallel_data)} entries")
         print("Sample entries:")
         print(parallel_df.head())
     
     # Save unknown.csv
     if unknown_data:
         unknown_df = pd.DataFrame(unknown_data)
-        unknown_df.to_csv("output/res/unknown.csv", index=False)
-        print(f"\nCreated output/res/unknown.csv with {len(unknown_data)} entries")
+        unknown_path = os.path.join(res_dir, "unknown.csv")
+        unknown_df.to_csv(unknown_path, index=False)
+        print(f"\nCreated {unknown_path} with {len(unknown_data)} entries")
         print("Sample entries:")
         print(unknown_df.head())
     
@@ -144,4 +154,10 @@ def process_sibling_files():
     print("="*50)
 
 if __name__ == "__main__":
-    process_sibling_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Categorize sibling pair files')
+    parser.add_argument('--sibling-dir', default='output/siblings',
+                        help='Sibling files to read (e.g. output/siblings_compact)')
+    parser.add_argument('--res-dir', default='output/res',
+                        help='Where parallel.csv, unknown.csv and uncertain/ are written')
+    args = parser.parse_args()
+    process_sibling_files(args.sibling_dir, args.res_dir)
\ No newline at end of file
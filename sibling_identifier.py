@@ -1,5 +1,11 @@
 import pandas as pd
+import numpy as np
 import os
+import sys
+import shutil
+import argparse
+import tempfile
+import itertools
 from collections import defaultdict
 import csv
 
@@ -8,14 +14,255 @@ try:
     from csv_filter import CSVFilter
     CSV_FILTER_AVAILABLE = True
 except ImportError:
-    print("Warning: csv_filter module not found. Contextual data processing will be skipped.")
+    print("Warning: csv_filter module not found. Contextual data processing will be skipped.", file=sys.stderr)
     CSV_FILTER_AVAILABLE = False
     CSVFilter = None
 
+from sketches import PairSketch, print_summary
+from external_sort import merge_runs, write_run
+
+SIBLING_FIELDNAMES = [
+    'traceid', 'rpcid', 'um', 'uminstanceid',
+    'dm1', 'dminstanceid1', 'dm1_start_time',
+    'dm2', 'dminstanceid2', 'dm2_start_time',
+    'execution_order',
+    'dm1_end_time', 'dm2_end_time', 'overlap', 'gap', 'first_started'
+]
+
+# Compact mode: one row per (traceid, rpcid, um, dm1, dm2). The per-call
+# fields describe the earliest dm1 and dm2 calls; the tallies cover all
+# dm1_calls * dm2_calls pairs the full mode would have written.
+SIBLING_COMPACT_FIELDNAMES = SIBLING_FIELDNAMES + [
+    'dm1_calls', 'dm2_calls', 'multiplicity', 'concurrent', 'sequential'
+]
+
+def parse_rpcid(rpcid):
+    """Parse rpcid to get parent prefix and last segment"""
+    parts = rpcid.split('.')
+    if len(parts) <= 1:
+        return rpcid, ""
+    parent_prefix = '.'.join(parts[:-1])
+    last_segment = parts[-1]
+    return parent_prefix, last_segment
+
+def analyze_execution_order(s1, s2):
+    """Determine execution order between two siblings"""
+    s1_start = s1['timestamp']
+    s1_end = s1['timestamp'] + s1['rt']
+    s2_start = s2['timestamp']
+    s2_end = s2['timestamp'] + s2['rt']
+    
+    if s1_end <= s2_start:
+        return 'sequential'
+    elif s2_end <= s1_start:
+        return 'sequential'
+    else:
+        return 'concurrent'
+
+def create_record(traceid, prefix, um, s1, s2, execution_order):
+    """Create a record with consistent dm1/dm2 ordering"""
+    # Always put the lexicographically smaller service as dm1
+    if s1['dm'] > s2['dm']:
+        dm1_data = s2
+        dm2_data = s1
+    else:
+        dm1_data = s1
+        dm2_data = s2
+    
+    dm1_start, dm2_start = dm1_data['timestamp'], dm2_data['timestamp']
+    dm1_end = float(dm1_start) + float(dm1_data['rt'])
+    dm2_end = float(dm2_start) + float(dm2_data['rt'])
+    if dm1_start < dm2_start:
+        first_started = 'dm1'
+    elif dm2_start < dm1_start:
+        first_started = 'dm2'
+    else:
+        first_started = 'tie'
+    
+    return {
+        'traceid': traceid,
+        'rpcid': prefix,
+        'um': um,
+        'uminstanceid': dm1_data['uminstanceid'],
+        'dm1': dm1_data['dm'],
+        'dminstanceid1': dm1_data['dminstanceid'],
+        'dm1_start_time': dm1_data['timestamp'],
+        'dm2': dm2_data['dm'],
+        'dminstanceid2': dm2_data['dminstanceid'],
+        'dm2_start_time': dm2_data['timestamp'],
+        'execution_order': execution_order,
+        'dm1_end_time': dm1_end,
+        'dm2_end_time': dm2_end,
+        # Time both calls were in flight, and the idle time between them
+        'overlap': max(0.0, min(dm1_end, dm2_end) - max(dm1_start, dm2_start)),
+        'gap': max(0.0, max(dm1_start, dm2_start) - min(dm1_end, dm2_end)),
+        'first_started': first_started
+    }
+
+def find_sibling_pairs(df):
+    """
+    Vectorized sibling detection for a whole CallGraph frame: every pair of
+    calls with the same (traceid, um, parent rpcid) and different dm, as a
+    DataFrame with SIBLING_FIELDNAMES columns (same values as create_record).
+    """
+    calls = df[['traceid', 'um', 'rpcid', 'dm', 'dminstanceid', 'uminstanceid', 'timestamp', 'rt']]
+    # Like groupby, calls without a traceid or um belong to no group
+    calls = calls.dropna(subset=['traceid', 'um'])
+    rpcid = calls['rpcid'].astype(str)
+    parts = rpcid.str.rpartition('.')
+    # Same rule as parse_rpcid: an rpcid without '.' is its own prefix
+    prefix = parts[0].where(parts[1] != '', rpcid)
+    calls = calls.assign(rpcid=prefix.values)
+    calls = calls.sort_values(['traceid', 'um', 'rpcid'], kind='stable').reset_index(drop=True)
+    group_ids = calls.groupby(['traceid', 'um', 'rpcid'], sort=False).ngroup().values.astype(np.int64)
+
+    # Row r at position p in a group of size k pairs with the k - 1 - p rows after it
+    sizes = np.bincount(group_ids)
+    group_starts = np.cumsum(sizes) - sizes
+    positions = np.arange(len(calls)) - group_starts[group_ids]
+    partners = sizes[group_ids] - 1 - positions
+    left = np.repeat(np.arange(len(calls)), partners)
+    run_starts = np.repeat(np.cumsum(partners) - partners, partners)
+    right = left + 1 + (np.arange(len(left)) - run_starts)
+
+    dm = calls['dm'].values
+    different = dm[left] != dm[right]
+    left, right = left[different], right[different]
+    # dm1 is the lexicographically smaller service
+    swap = dm[left] > dm[right]
+    first = np.where(swap, right, left)
+    second = np.where(swap, left, right)
+
+    start = calls['timestamp'].values
+    end = start.astype(np.float64) + calls['rt'].values.astype(np.float64)
+    start1, start2 = start[first], start[second]
+    end1, end2 = end[first], end[second]
+    sequential = (end1 <= start2) | (end2 <= start1)
+    later_start = np.maximum(start1, start2).astype(np.float64)
+    earlier_end = np.minimum(end1, end2)
+
+    return pd.DataFrame({
+        'traceid': calls['traceid'].values[first],
+        'rpcid': calls['rpcid'].values[first],
+        'um': calls['um'].values[first],
+        'uminstanceid': calls['uminstanceid'].values[first],
+        'dm1': dm[first],
+        'dminstanceid1': calls['dminstanceid'].values[first],
+        'dm1_start_time': start1,
+        'dm2': dm[second],
+        'dminstanceid2': calls['dminstanceid'].values[second],
+        'dm2_start_time': start2,
+        'execution_order': np.where(sequential, 'sequential', 'concurrent'),
+        'dm1_end_time': end1,
+        'dm2_end_time': end2,
+        'overlap': np.maximum(0.0, earlier_end - later_start),
+        'gap': np.maximum(0.0, later_start - earlier_end),
+        'first_started': np.where(start1 < start2, 'dm1', np.where(start2 < start1, 'dm2', 'tie')),
+    }, columns=SIBLING_FIELDNAMES)
+
+def count_sequential(starts1, ends1, starts2, ends2):
+    """Number of sequential pairs between two call sets, in O(k log k)"""
+    sorted_starts2 = np.sort(starts2)
+    sorted_ends2 = np.sort(ends2)
+    # calls of set 2 starting after a set-1 call ends, plus those ending before it starts
+    after = len(sorted_starts2) - np.searchsorted(sorted_starts2, ends1, side='left')
+    before = np.searchsorted(sorted_ends2, starts1, side='right')
+    # With rt > 0 (preprocessing drops rt == 0) no pair is counted twice
+    return int(after.sum() + before.sum())
+
+def create_compact_records(traceid, prefix, um, siblings):
+    """Collapse all sibling pairs of one prefix group into one record per (dm1, dm2)"""
+    by_dm = defaultdict(list)
+    for sibling in siblings:
+        by_dm[sibling['dm']].append(sibling)
+    if len(by_dm) < 2:
+        return []
+
+    calls = {}
+    for dm, group in by_dm.items():
+        starts = np.array([call['timestamp'] for call in group], dtype=np.float64)
+        ends = starts + np.array([call['rt'] for call in group], dtype=np.float64)
+        calls[dm] = (group[int(np.argmin(starts))], starts, ends)
+
+    records = []
+    dms = sorted(by_dm)
+    for i in range(len(dms)):
+        first1, starts1, ends1 = calls[dms[i]]
+        for j in range(i + 1, len(dms)):
+            first2, starts2, ends2 = calls[dms[j]]
+            multiplicity = len(starts1) * len(starts2)
+            sequential = count_sequential(starts1, ends1, starts2, ends2)
+            record = create_record(traceid, prefix, um, first1, first2,
+                                   analyze_execution_order(first1, first2))
+            record.update({
+                'dm1_calls': len(starts1),
+                'dm2_calls': len(starts2),
+                'multiplicity': multiplicity,
+                'concurrent': multiplicity - sequential,
+                'sequential': sequential,
+            })
+            records.append(record)
+    return records
+
+def find_sibling_records(traceid, um, calls, compact=False):
+    """Sibling records among the calls one (traceid, um) made, grouped by parent rpcid"""
+    prefix_groups = defaultdict(list)
+    for call in calls:
+        parent_prefix, last_segment = parse_rpcid(call['rpcid'])
+        prefix_groups[parent_prefix].append(call)
+
+    for prefix, siblings in prefix_groups.items():
+        if len(siblings) < 2:
+            continue
+        if compact:
+            yield from create_compact_records(traceid, prefix, um, siblings)
+            continue
+        # Create all sibling pairs
+        for i in range(len(siblings)):
+            for j in range(i + 1, len(siblings)):
+                s1, s2 = siblings[i], siblings[j]
+                if s1['dm'] != s2['dm']:  # Different downstream services
+                    yield create_record(traceid, prefix, um, s1, s2, analyze_execution_order(s1, s2))
+
+def trace_batches(df, batch_calls):
+    """Split a CallGraph frame into frames of whole traces with about batch_calls calls each"""
+    codes, _ = pd.factorize(df['traceid'])
+    valid = codes >= 0
+    if not valid.any():
+        return
+    sizes = np.bincount(codes[valid])
+    # A trace's batch is decided by the calls of the traces before it
+    trace_batch = (np.cumsum(sizes) - sizes) // batch_calls
+    row_batch = np.where(valid, trace_batch[np.maximum(codes, 0)], -1)
+    order = np.argsort(row_batch, kind='stable')
+    row_batch = row_batch[order]
+    bounds = np.flatnonzero(np.diff(row_batch)) + 1
+    for start, end in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(order)]])):
+        if end > start and row_batch[start] >= 0:
+            yield df.iloc[order[start:end]]
+
+# Full-mode calls per vectorized batch; pairs grow with the square of group size
+PAIR_BATCH_CALLS = 100000
+
+# Call fields kept in external-sort runs; the run sort key is (traceid, um)
+SPILL_CALL_FIELDS = ['traceid', 'um', 'rpcid', 'dm', 'dminstanceid', 'uminstanceid', 'timestamp', 'rt']
+
 class SimpleSiblingAnalyzer:
-    def __init__(self, input_folder):
+    def __init__(self, input_folder, use_sketches=False, compact=False, spill_dir=None,
+                 chunk_rows=1000000, run_records=1000000):
         """Initialize with the input folder containing MSCallGraph files"""
         self.input_folder = input_folder
+        # Fixed-memory pair statistics instead of exact per-file dicts
+        self.use_sketches = use_sketches
+        self.sketch = PairSketch() if use_sketches else None
+        # One row per (traceid, rpcid, um, dm1, dm2) with multiplicity counts
+        self.compact = compact
+        self.sibling_subdir = "siblings_compact" if compact else "siblings"
+        self.fieldnames = SIBLING_COMPACT_FIELDNAMES if compact else SIBLING_FIELDNAMES
+        # External-sort mode: bounded memory, sorted runs spilled under spill_dir
+        self.spill_dir = spill_dir
+        self.chunk_rows = chunk_rows
+        self.run_records = run_records
         self.largest_timestamp = None
         self.processed_files = []
         self.file_stats = {}
@@ -32,36 +279,21 @@ class SimpleSiblingAnalyzer:
     def setup_output_structure(self, output_dir):
         """Set up output directory structure"""
         self.output_dir = output_dir
-        os.makedirs(os.path.join(output_dir, "siblings"), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, self.sibling_subdir), exist_ok=True)
     
     def parse_rpcid(self, rpcid):
         """Parse rpcid to get parent prefix and last segment"""
-        parts = rpcid.split('.')
-        if len(parts) <= 1:
-            return rpcid, ""
-        parent_prefix = '.'.join(parts[:-1])
-        last_segment = parts[-1]
-        return parent_prefix, last_segment
+        return parse_rpcid(rpcid)
     
     def analyze_execution_order(self, s1, s2):
         """Determine execution order between two siblings"""
-        s1_start = s1['timestamp']
-        s1_end = s1['timestamp'] + s1['rt']
-        s2_start = s2['timestamp']
-        s2_end = s2['timestamp'] + s2['rt']
-        
-        if s1_end <= s2_start:
-            return 'sequential'
-        elif s2_end <= s1_start:
-            return 'sequential'
-        else:
-            return 'concurrent'
+        return analyze_execution_order(s1, s2)
     
     def get_sibling_filename(self, dm1, dm2):
         """Get standard filename for a sibling pair"""
         sorted_names = tuple(sorted([dm1, dm2]))
         filename = f"sibling_{sorted_names[0]}_{sorted_names[1]}.csv"
-        return os.path.join(self.output_dir, "siblings", filename)
+        return os.path.join(self.output_dir, self.sibling_subdir, filename)
     
     def get_writer(self, dm1, dm2, create_new=False):
         """Get or create a CSV writer for the sibling pair"""
@@ -76,12 +308,7 @@ class SimpleSiblingAnalyzer:
             self.sibling_file_handles[key] = file_handle
             
             # Create CSV writer
-            writer = csv.DictWriter(file_handle, fieldnames=[
-                'traceid', 'rpcid', 'um', 'uminstanceid',
-                'dm1', 'dminstanceid1', 'dm1_start_time',
-                'dm2', 'dminstanceid2', 'dm2_start_time',
-                'execution_order'
-            ])
+            writer = csv.DictWriter(file_handle, fieldnames=self.fieldnames)
             
             # Write header if file is new
             if not file_exists:
@@ -110,81 +337,95 @@ class SimpleSiblingAnalyzer:
         writer = self.get_writer(ordered_record['dm1'], ordered_record['dm2'])
         writer.writerow(ordered_record)
 
+    def write_pairs(self, pairs, chunk_rows=100000):
+        """Append a frame of records to the per-pair files, one block per pair and chunk"""
+        # Visit rows grouped by pair through an index order instead of a sorted copy
+        order = np.lexsort((pairs['dm2'].values, pairs['dm1'].values))
+        dm1_col, dm2_col = SIBLING_FIELDNAMES.index('dm1'), SIBLING_FIELDNAMES.index('dm2')
+        pair_key = lambda row: (row[dm1_col], row[dm2_col])
+        for start in range(0, len(order), chunk_rows):
+            rows = pairs.iloc[order[start:start + chunk_rows]].values.tolist()
+            for (dm1, dm2), block in itertools.groupby(rows, key=pair_key):
+                self.get_writer(dm1, dm2)
+                # Same csv dialect as the DictWriter that wrote the header
+                csv.writer(self.sibling_file_handles[(dm1, dm2)]).writerows(block)
+    
+    def count_pairs(self, pairs, sibling_stats, sketch=None):
+        """Add a frame of full-mode records to the pair statistics (or the sketch)"""
+        concurrent = (pairs['execution_order'] == 'concurrent').astype(np.int64)
+        if sketch is not None:
+            counts = concurrent.groupby([pairs['dm1'], pairs['dm2'], pairs['traceid']]).agg(['size', 'sum'])
+            for (dm1, dm2, traceid), (total, parallel) in zip(counts.index, counts.values):
+                sketch.update_counts(dm1, dm2, traceid, int(total), int(parallel))
+            return
+        counts = concurrent.groupby([pairs['dm1'], pairs['dm2']]).agg(['size', 'sum'])
+        for key, (total, parallel) in zip(counts.index, counts.values):
+            sibling_stats[key]['total'] += int(total)
+            sibling_stats[key]['parallel'] += int(parallel)
+            sibling_stats[key]['sequential'] += int(total - parallel)
+
     # Additionally, you should update create_record logic to ensure consistent creation:
     def create_record(self, traceid, prefix, um, s1, s2, execution_order):
         """Create a record with consistent dm1/dm2 ordering"""
-        # Always put the lexicographically smaller service as dm1
-        if s1['dm'] > s2['dm']:
-            dm1_data = s2
-            dm2_data = s1
-        else:
-            dm1_data = s1
-            dm2_data = s2
-        
-        return {
-            'traceid': traceid,
-            'rpcid': prefix,
-            'um': um,
-            'uminstanceid': dm1_data['uminstanceid'],
-            'dm1': dm1_data['dm'],
-            'dminstanceid1': dm1_data['dminstanceid'],
-            'dm1_start_time': dm1_data['timestamp'],
-            'dm2': dm2_data['dm'],
-            'dminstanceid2': dm2_data['dminstanceid'],
-            'dm2_start_time': dm2_data['timestamp'],
-            'execution_order': execution_order
-        }
+        return create_record(traceid, prefix, um, s1, s2, execution_order)
 
     # Modified process_single_file method to use the new create_record:
     def process_single_file(self, df, file_idx, total_files):
         """Process a single CSV file's data to find siblings"""
         sibling_stats = defaultdict(lambda: {'total': 0, 'parallel': 0, 'sequential': 0})
+        file_sketch = PairSketch() if self.use_sketches else None
         records_written = 0
         
+        if not self.compact:
+            # Full mode: vectorized over batches of whole traces so the pair frame stays bounded
+            for calls in trace_batches(df, PAIR_BATCH_CALLS):
+                pairs = find_sibling_pairs(calls)
+                records_written += len(pairs)
+                self.count_pairs(pairs, sibling_stats, file_sketch)
+                self.write_pairs(pairs)
+            self.report_stats(records_written, sibling_stats, file_sketch)
+            return
+        
         # Group by traceid and um
         grouped = df.groupby(['traceid', 'um'])
         
         for (traceid, um), group in grouped:
-            # Parse rpcids and group by parent prefix
-            prefix_groups = defaultdict(list)
-            
-            for idx, row in group.iterrows():
-                parent_prefix, last_segment = self.parse_rpcid(row['rpcid'])
-                prefix_groups[parent_prefix].append({
-                    'dm': row['dm'],
-                    'dminstanceid': row['dminstanceid'],
-                    'uminstanceid': row['uminstanceid'],
-                    'timestamp': row['timestamp'],
-                    'rt': row['rt'],
-                    'rpcid': row['rpcid'],
-                    'service': row['service'],
-                    'interface': row['interface']
-                })
-            
-            # For each prefix group, find sibling pairs
-            for prefix, siblings in prefix_groups.items():
-                if len(siblings) >= 2:
-                    # Create all sibling pairs
-                    for i in range(len(siblings)):
-                        for j in range(i + 1, len(siblings)):
-                            s1, s2 = siblings[i], siblings[j]
-                            if s1['dm'] != s2['dm']:  # Different downstream services
-                                execution_order = self.analyze_execution_order(s1, s2)
-                                
-                                # Create record with consistent ordering
-                                record = self.create_record(traceid, prefix, um, s1, s2, execution_order)
-                                
-                                # Write directly to file
-                                self.write_record(record)
-                                records_written += 1
-                                
-                                # Track statistics with consistent key
-                                key = tuple(sorted([s1['dm'], s2['dm']]))
-                                sibling_stats[key]['total'] += 1
-                                if execution_order == 'concurrent':
-                                    sibling_stats[key]['parallel'] += 1
-                                else:
-                                    sibling_stats[key]['sequential'] += 1
+            calls = group[['dm', 'dminstanceid', 'uminstanceid', 'timestamp', 'rt', 'rpcid']].to_dict('records')
+            for record in find_sibling_records(traceid, um, calls, compact=self.compact):
+                # Write directly to file
+                self.write_record(record)
+                records_written += 1
+                self.count_record(record, sibling_stats, file_sketch)
+        
+        self.report_stats(records_written, sibling_stats, file_sketch)
+    
+    def count_record(self, record, sibling_stats, sketch=None):
+        """Add one written record to the pair statistics (or the sketch)"""
+        if self.compact:
+            total, concurrent = record['multiplicity'], record['concurrent']
+        else:
+            total, concurrent = 1, int(record['execution_order'] == 'concurrent')
+        
+        if sketch is not None:
+            sketch.update_counts(record['dm1'], record['dm2'], record['traceid'], total, concurrent)
+            return
+        
+        # Track statistics with consistent key
+        key = (record['dm1'], record['dm2'])
+        sibling_stats[key]['total'] += total
+        sibling_stats[key]['parallel'] += concurrent
+        sibling_stats[key]['sequential'] += total - concurrent
+    
+    def report_stats(self, records_written, sibling_stats, file_sketch=None):
+        """Print record counts and the top pairs of one processing pass"""
+        if file_sketch is not None:
+            print(f"   ✓ Processed {records_written:,} sibling records")
+            print(f"   ✓ Found ~{file_sketch.pairs.estimate():,} unique sibling pairs")
+            print(f"   ✓ Top 5 sibling pairs:")
+            for pair in file_sketch.top_pairs(5):
+                print(f"      • {pair['dm1']}-{pair['dm2']}: {pair['total']:,} total")
+            self.sketch.merge(file_sketch)
+            return
         
         # Print statistics for this file
         print(f"   ✓ Processed {records_written:,} sibling records")
@@ -197,6 +438,92 @@ class SimpleSiblingAnalyzer:
             for (dm1, dm2), stats in sorted_stats[:5]:
                 print(f"      • {dm1}-{dm2}: {stats['total']:,} total")
     
+    def spill_calls(self, csv_files, run_dir):
+        """Phase 1: read the input in chunks and spill call runs sorted by (traceid, um)"""
+        runs = []
+        for idx, csv_file in enumerate(csv_files, 1):
+            print(f"\n[{idx}/{len(csv_files)}] SPILLING FILE: {csv_file}")
+            rows = 0
+            file_path = os.path.join(self.input_folder, csv_file)
+            for chunk in pd.read_csv(file_path, usecols=SPILL_CALL_FIELDS, chunksize=self.chunk_rows,
+                                     on_bad_lines='skip'):
+                chunk_max_timestamp = chunk['timestamp'].max()
+                if self.largest_timestamp is None or chunk_max_timestamp > self.largest_timestamp:
+                    self.largest_timestamp = chunk_max_timestamp
+                # groupby drops NaN keys in full mode; astype(str) would turn them into 'nan'
+                chunk = chunk[SPILL_CALL_FIELDS].dropna(subset=['traceid', 'um']).astype(str)
+                runs.append(write_run(chunk.values.tolist(), key=lambda row: (row[0], row[1]),
+                                      run_dir=run_dir, prefix='calls'))
+                rows += len(chunk)
+            print(f"   ✓ Spilled {rows:,} rows")
+            self.processed_files.append(csv_file)
+        return runs
+    
+    def detect_from_runs(self, call_runs, run_dir):
+        """Phase 2: merge call runs, detect siblings per (traceid, um), spill record runs sorted by pair"""
+        sibling_stats = defaultdict(lambda: {'total': 0, 'parallel': 0, 'sequential': 0})
+        sketch = PairSketch() if self.use_sketches else None
+        dm1_col, dm2_col = self.fieldnames.index('dm1'), self.fieldnames.index('dm2')
+        pair_key = lambda row: (row[dm1_col], row[dm2_col])
+        
+        record_runs = []
+        buffer = []
+        records_written = 0
+        merged = merge_runs(call_runs, key=lambda row: (row[0], row[1]), run_dir=run_dir)
+        for (traceid, um), rows in itertools.groupby(merged, key=lambda row: (row[0], row[1])):
+            calls = [{
+                'rpcid': row[2],
+                'dm': row[3],
+                'dminstanceid': row[4],
+                'uminstanceid': row[5],
+                'timestamp': int(float(row[6])),
+                'rt': float(row[7]),
+            } for row in rows]
+            for record in find_sibling_records(traceid, um, calls, compact=self.compact):
+                buffer.append([record[name] for name in self.fieldnames])
+                records_written += 1
+                self.count_record(record, sibling_stats, sketch)
+            if len(buffer) >= self.run_records:
+                record_runs.append(write_run(buffer, key=pair_key, run_dir=run_dir, prefix='records'))
+                buffer = []
+        if buffer:
+            record_runs.append(write_run(buffer, key=pair_key, run_dir=run_dir, prefix='records'))
+        
+        self.report_stats(records_written, sibling_stats, sketch)
+        return record_runs
+    
+    def write_from_runs(self, record_runs, run_dir):
+        """Phase 3: k-way merge record runs and write each pair's file sequentially"""
+        dm1_col, dm2_col = self.fieldnames.index('dm1'), self.fieldnames.index('dm2')
+        pair_key = lambda row: (row[dm1_col], row[dm2_col])
+        files_written = 0
+        merged = merge_runs(record_runs, key=pair_key, run_dir=run_dir)
+        for (dm1, dm2), rows in itertools.groupby(merged, key=pair_key):
+            filename = self.get_sibling_filename(dm1, dm2)
+            file_exists = os.path.exists(filename)
+            with open(filename, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if not file_exists:
+                    writer.writerow(self.fieldnames)
+                writer.writerows(rows)
+            files_written += 1
+        print(f"   ✓ Wrote {files_written:,} sibling pair files")
+    
+    def run_external(self, csv_files):
+        """Detect siblings with a fixed memory ceiling using external sorting"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        run_dir = tempfile.mkdtemp(prefix='siblings_', dir=self.spill_dir)
+        try:
+            call_runs = self.spill_calls(csv_files, run_dir)
+            print(f"\nMERGING {len(call_runs)} CALL RUNS")
+            print("-" * 40)
+            record_runs = self.detect_from_runs(call_runs, run_dir)
+            print(f"\nMERGING {len(record_runs)} RECORD RUNS")
+            print("-" * 40)
+            self.write_from_runs(record_runs, run_dir)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+    
     def cleanup(self):
         """Close all file handles"""
         for file_handle in self.sibling_file_handles.values():
@@ -204,13 +531,24 @@ class SimpleSiblingAnalyzer:
     
     def analyze_output_files(self):
         """Analyze the final output files"""
-        sibling_dir = os.path.join(self.output_dir, "siblings")
+        sibling_dir = os.path.join(self.output_dir, self.sibling_subdir)
         sibling_files = [f for f in os.listdir(sibling_dir) if f.endswith('.csv')]
         
         print("\n" + "="*60)
         print("OUTPUT FILES ANALYSIS")
         print("="*60)
         
+        # The sketch already summarizes everything written; no need to re-read
+        if self.sketch is not None:
+            sketch_path = os.path.join(self.output_dir, "sketch.pkl")
+            self.sketch.save(sketch_path)
+            print("\n" + "-"*60)
+            print(f"TOTAL SUMMARY (approximate, from {sketch_path}):")
+            print_summary(self.sketch, top=5)
+            print("-"*60)
+            return
+        
+        total_rows = 0
         total_records = 0
         total_parallel = 0
         total_sequential = 0
@@ -220,12 +558,18 @@ class SimpleSiblingAnalyzer:
             df = pd.read_csv(file_path)
             
             unique_traces = df['traceid'].nunique()
-            execution_counts = df['execution_order'].value_counts()
-            
-            file_parallel = execution_counts.get('concurrent', 0)
-            file_sequential = execution_counts.get('sequential', 0)
-            
-            total_records += len(df)
+            total_rows += len(df)
+
+            if 'multiplicity' in df.columns:
+                # Compact rows stand for `multiplicity` full-mode records
+                file_parallel = df['concurrent'].sum()
+                file_sequential = df['sequential'].sum()
+                total_records += df['multiplicity'].sum()
+            else:
+                execution_counts = df['execution_order'].value_counts()
+                file_parallel = execution_counts.get('concurrent', 0)
+                file_sequential = execution_counts.get('sequential', 0)
+                total_records += len(df)
             total_parallel += file_parallel
             total_sequential += file_sequential
 
@@ -234,6 +578,8 @@ class SimpleSiblingAnalyzer:
         print(f"TOTAL SUMMARY:")
         print(f"   • Unique sibling pairs: {len(sibling_files):,}")
         print(f"   • Total records: {total_records:,}")
+        if self.compact:
+            print(f"   • Compact rows written: {total_rows:,}")
         print(f"   • Parallel executions: {total_parallel:,} ({total_parallel/total_records*100:.1f}%)")
         print(f"   • Sequential executions: {total_sequential:,} ({total_sequential/total_records*100:.1f}%)")
         print("-"*60)
@@ -256,6 +602,10 @@ class SimpleSiblingAnalyzer:
         print("-"*60)
         
         try:
+            if self.spill_dir is not None:
+                self.run_external(csv_files)
+                csv_files = []
+            
             # Process each file
             for idx, csv_file in enumerate(csv_files, 1):
                 print(f"\n[{idx}/{len(csv_files)}] PROCESSING FILE: {csv_file}")
@@ -295,15 +645,30 @@ class SimpleSiblingAnalyzer:
         print("\n" + "="*60)
         print("🎉 ANALYSIS COMPLETE!")
         print("="*60)
-        print(f"\n📁 OUTPUT LOCATION: {output_dir}/siblings/")
+        print(f"\n📁 OUTPUT LOCATION: {output_dir}/{self.sibling_subdir}/")
         print(f"⏱️ Largest timestamp: {self.largest_timestamp}")
         print("\n" + "="*60 + "\n")
 
 # Example usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Find sibling pairs in MSCallGraph files')
+    parser.add_argument('input_folder', nargs='?', default="capser-output-2022/output-rebuild",
+                        help='Folder containing MSCallGraph CSV files')
+    parser.add_argument('--output-dir', default="output", help='Output root (siblings/ is created inside)')
+    parser.add_argument('--sketches', action='store_true', help='Keep fixed-memory pair sketches')
+    parser.add_argument('--compact', action='store_true', help='Write compact rows to siblings_compact/')
+    parser.add_argument('--spill-dir', help='External-sort mode: directory for temporary sorted runs')
+    parser.add_argument('--chunk-rows', type=int, default=1000000,
+                        help='Input rows per call run in external-sort mode')
+    parser.add_argument('--run-records', type=int, default=1000000,
+                        help='Sibling records per record run in external-sort mode')
+    args = parser.parse_args()
+
     # Initialize simple analyzer
-    analyzer = SimpleSiblingAnalyzer("capser-output-2022/output-rebuild")
+    analyzer = SimpleSiblingAnalyzer(args.input_folder, use_sketches=args.sketches, compact=args.compact,
+                                     spill_dir=args.spill_dir, chunk_rows=args.chunk_rows,
+                                     run_records=args.run_records)
     
     # Run analysis without processing contextual data
-    analyzer.run_analysis(output_dir="output")
+    analyzer.run_analysis(output_dir=args.output_dir)
     
\ No newline at end of file
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Sorted on-disk store for sibling records with a byte-range key index.
+
+build_sibling_store() packs every output/siblings/*.csv into one CSV sorted
+by (dm1, dm2, um, start time), where start time is the earlier of the two
+calls. The index records the byte range, row count and time span of each
+(dm1, dm2, um) segment, so SiblingStore.query() only seeks to and parses the
+segments a (dm1, dm2) / um / time-range filter can match.
+"""
+
+import io
+import os
+import csv
+import glob
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+
+SEGMENT_KEY = ['dm1', 'dm2', 'um']
+
+
+def build_sibling_store(sibling_dir="output/siblings", store_dir="output/sibling_store"):
+    """Pack sibling CSV files into one sorted data file plus a segment index."""
+    start_time = time.time()
+    sibling_files = sorted(glob.glob(os.path.join(sibling_dir, "*.csv")))
+    print(f"Found {len(sibling_files)} CSV files in {sibling_dir}")
+
+    frames = []
+    for csv_file in sibling_files:
+        try:
+            frames.append(pd.read_csv(csv_file))
+        except Exception as e:
+            print(f"Error processing {csv_file}: {e}")
+    if not frames:
+        raise ValueError(f"No sibling records found in {sibling_dir}")
+
+    df = pd.concat(frames, ignore_index=True)
+    columns = list(df.columns)
+    start = np.minimum(df['dm1_start_time'].values, df['dm2_start_time'].values)
+    df = df.assign(_start=start).sort_values(SEGMENT_KEY + ['_start'], kind='stable')
+    start = df.pop('_start').values
+    df = df.reset_index(drop=True)
+
+    # Keep NaN keys as segments of their own so the row counts cover every written row
+    segments = df.groupby(SEGMENT_KEY, sort=False, dropna=False).size().reset_index(name='rows')
+    last_rows = np.cumsum(segments['rows'].values)
+    first_rows = last_rows - segments['rows'].values
+    # Rows are sorted by start time within a segment
+    segments['tmin'] = start[first_rows]
+    segments['tmax'] = start[last_rows - 1]
+
+    # One block per segment; quoted fields may contain newlines, so byte
+    # ranges come from the file position rather than from counting lines
+    os.makedirs(store_dir, exist_ok=True)
+    offsets = np.zeros(len(segments), dtype=np.int64)
+    lengths = np.zeros(len(segments), dtype=np.int64)
+    # Missing values are written as empty fields, as to_csv would
+    rows = df.astype(object).where(df.notna(), '').values.tolist()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def take_block():
+        block = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return block
+
+    with open(os.path.join(store_dir, "siblings.csv"), 'wb') as f:
+        writer.writerow(columns)
+        f.write(take_block())
+        for i, (first, last) in enumerate(zip(first_rows, last_rows)):
+            writer.writerows(rows[first:last])
+            offsets[i] = f.tell()
+            f.write(take_block())
+            lengths[i] = f.tell() - offsets[i]
+    segments['offset'] = offsets
+    segments['length'] = lengths
+    with open(os.path.join(store_dir, "index.pkl"), 'wb') as f:
+        pickle.dump({'columns': columns, 'segments': segments}, f)
+
+    print(f"Stored {len(df):,} records in {len(segments):,} (pair, um) segments "
+          f"in {time.time() - start_time:.2f} seconds")
+    print(f"Saved store to {store_dir}")
+    return store_dir
+
+
+class SiblingStore:
+    def __init__(self, store_dir="output/sibling_store"):
+        """Open a store built by build_sibling_store"""
+        with open(os.path.join(store_dir, "index.pkl"), 'rb') as f:
+            index = pickle.load(f)
+        self.columns = index['columns']
+        self.segments = index['segments']
+        self.data_path = os.path.join(store_dir, "siblings.csv")
+
+    def pairs(self):
+        """All (dm1, dm2) pairs with their record counts"""
+        return self.segments.groupby(['dm1', 'dm2'])['rows'].sum()
+
+    def query(self, dm1=None, dm2=None, um=None, start=None, end=None):
+        """
+        Records matching a (dm1, dm2) pair (order-insensitive), a um and/or a
+        [start, end] range on the pair's earlier start time.
+        """
+        segments = self.segments
+        mask = np.ones(len(segments), dtype=bool)
+        if dm1 is not None and dm2 is not None:
+            dm1, dm2 = sorted([dm1, dm2])
+        if dm1 is not None:
+            mask &= (segments['dm1'] == dm1).values
+        if dm2 is not None:
+            mask &= (segments['dm2'] == dm2).values
+        if um is not None:
+            mask &= (segments['um'] == um).values
+        if start is not None:
+            mask &= (segments['tmax'] >= start).values
+        if end is not None:
+            mask &= (segments['tmin'] <= end).values
+        selected = segments[mask]
+        if selected.empty:
+            return pd.DataFrame(columns=self.columns)
+
+        # Coalesce adjacent segments into contiguous byte ranges
+        offsets = selected['offset'].values
+        ends = offsets + selected['length'].values
+        breaks = np.flatnonzero(offsets[1:] != ends[:-1]) + 1
+        range_starts = offsets[np.concatenate([[0], breaks])]
+        range_ends = ends[np.concatenate([breaks - 1, [len(ends) - 1]])]
+
+        chunks = []
+        with open(self.data_path, 'rb') as f:
+            for range_start, range_end in zip(range_starts, range_ends):
+                f.seek(range_start)
+                chunks.append(f.read(range_end - range_start))
+        df = pd.read_csv(io.BytesIO(b''.join(chunks)), names=self.columns, header=None)
+
+        if start is not None or end is not None:
+            pair_start = np.minimum(df['dm1_start_time'].values, df['dm2_start_time'].values)
+            keep = np.ones(len(df), dtype=bool)
+            if start is not None:
+                keep &= pair_start >= start
+            if end is not None:
+                keep &= pair_start <= end
+            df = df[keep].reset_index(drop=True)
+        return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the sorted sibling store')
+    parser.add_argument('--store', default='output/sibling_store', help='Store directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Pack sibling CSV files into the store')
+    build_parser.add_argument('--sibling-dir', default='output/siblings',
+                              help='Directory with sibling_<dm1>_<dm2>.csv files')
+    query_parser = subparsers.add_parser('query', help='Fetch matching records')
+    query_parser.add_argument('--dm1')
+    query_parser.add_argument('--dm2')
+    query_parser.add_argument('--um')
+    query_parser.add_argument('--start', type=int, help='Earliest pair start time (ms)')
+    query_parser.add_argument('--end', type=int, help='Latest pair start time (ms)')
+    query_parser.add_argument('--output', help='Write matches to this CSV instead of stdout')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_sibling_store(args.sibling_dir, args.store)
+        return
+
+    query_start = time.time()
+    result = SiblingStore(args.store).query(dm1=args.dm1, dm2=args.dm2, um=args.um,
+                                            start=args.start, end=args.end)
+    elapsed = (time.time() - query_start) * 1000
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"Wrote {len(result):,} records to {args.output} ({elapsed:.1f} ms)")
+    else:
+        print(result.to_string())
+        print(f"{len(result):,} records ({elapsed:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Fixed-memory, mergeable sketches for sibling pair statistics.
+
+- CountMinSketch: approximate per-pair record and concurrent counts
+- SpaceSaving:    heavy-hitter sibling pairs with bounded error
+- HyperLogLog:    distinct traceids (globally and per heavy-hitter pair)
+                  and the number of distinct pairs
+
+PairSketch bundles them for SimpleSiblingAnalyzer. Every sketch has a
+merge() so per-file or per-worker sketches can be combined, and a
+PairSketch can be saved/loaded with pickle for merging across runs.
+"""
+
+import sys
+import heapq
+import pickle
+import hashlib
+import argparse
+import numpy as np
+
+
+def hash_item(item):
+    """Two independent 64-bit hashes of a string key"""
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+def pair_key(dm1, dm2):
+    """Canonical key for an unordered sibling pair"""
+    dm1, dm2 = sorted([dm1, dm2])
+    return f"{dm1}|{dm2}"
+
+
+class CountMinSketch:
+    def __init__(self, width=2 ** 16, depth=4):
+        """depth x width counters; overestimates by at most e/width * total w.p. 1 - e^-depth"""
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def _columns(self, hashes):
+        h1, h2 = hashes
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add_hashed(self, hashes, count=1):
+        for row, col in enumerate(self._columns(hashes)):
+            self.table[row, col] += count
+
+    def estimate_hashed(self, hashes):
+        return int(min(self.table[row, col] for row, col in enumerate(self._columns(hashes))))
+
+    def add(self, item, count=1):
+        self.add_hashed(hash_item(item), count)
+
+    def estimate(self, item):
+        return self.estimate_hashed(hash_item(item))
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Cannot merge count-min sketches of different shapes")
+        self.table += other.table
+        return self
+
+
+class HyperLogLog:
+    def __init__(self, precision=12):
+        """2^precision registers; relative error about 1.04 / sqrt(2^precision)"""
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = np.zeros(self.num_registers, dtype=np.uint8)
+
+    def add_hashed(self, hashes):
+        value = hashes[0]
+        index = value >> (64 - self.precision)
+        remaining = value & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, item):
+        self.add_hashed(hash_item(item))
+
+    def estimate(self):
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting in the small range
+        if raw <= 2.5 * m and zeros > 0:
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+    def merge(self, other):
+        if self.precision != other.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+
+class SpaceSaving:
+    def __init__(self, capacity=1000):
+        """Track at most `capacity` items; counts overestimate by at most `error`"""
+        self.capacity = capacity
+        self.counters = {}  # item -> [count, error]
+        self._heap = []     # lazy (count, item) entries for finding the minimum
+
+    def _push(self, item):
+        heapq.heappush(self._heap, (self.counters[item][0], item))
+        # Stale entries accumulate as counts grow; rebuild occasionally
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(counter[0], key) for key, counter in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while self._heap:
+            count, item = heapq.heappop(self._heap)
+            counter = self.counters.get(item)
+            if counter is not None and counter[0] == count:
+                return item
+        return None
+
+    def add(self, item, count=1):
+        """Count an item; returns the item it evicted, if any"""
+        evicted = None
+        if item in self.counters:
+            self.counters[item][0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            evicted = self._pop_min()
+            min_count = self.counters.pop(evicted)[0]
+            self.counters[item] = [min_count + count, min_count]
+        self._push(item)
+        return evicted
+
+    def min_count(self):
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def top(self, k=10):
+        """Heaviest items as (item, count, error), largest first"""
+        items = sorted(self.counters.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in items[:k]]
+
+    def merge(self, other):
+        """Mergeable summary: unseen items are bounded by the other side's minimum"""
+        self_min, other_min = self.min_count(), other.min_count()
+        merged = {}
+        for item in set(self.counters) | set(other.counters):
+            count_a, error_a = self.counters.get(item, [self_min, self_min])
+            count_b, error_b = other.counters.get(item, [other_min, other_min])
+            merged[item] = [count_a + count_b, error_a + error_b]
+        kept = sorted(merged.items(), key=lambda entry: entry[1][0], reverse=True)[:self.capacity]
+        self.counters = dict(kept)
+        self._heap = [(counter[0], key) for key, counter in self.counters.items()]
+        heapq.heapify(self._heap)
+        return self
+
+
+class PairSketch:
+    def __init__(self, cms_width=2 ** 16, cms_depth=4, heavy_hitters=1000,
+                 trace_precision=14, pair_trace_precision=10):
+        """Fixed-memory summary of sibling pair records"""
+        self.pair_counts = CountMinSketch(cms_width, cms_depth)
+        self.concurrent_counts = CountMinSketch(cms_width, cms_depth)
+        self.heavy_pairs = SpaceSaving(heavy_hitters)
+        self.traces = HyperLogLog(trace_precision)
+        self.pairs = HyperLogLog(trace_precision)
+        self.pair_trace_precision = pair_trace_precision
+        # Distinct traceids, kept only for pairs monitored by heavy_pairs
+        self.pair_traces = {}
+        self.total_records = 0
+        self.total_concurrent = 0
+
+    def update(self, dm1, dm2, traceid, execution_order):
+        self.update_counts(dm1, dm2, traceid, 1, int(execution_order == 'concurrent'))
+
+    def update_counts(self, dm1, dm2, traceid, total, concurrent):
+        """Add `total` records (of which `concurrent` are concurrent) for one pair and trace"""
+        key = pair_key(dm1, dm2)
+        key_hashes = hash_item(key)
+        trace_hashes = hash_item(traceid)
+
+        self.total_records += total
+        self.pair_counts.add_hashed(key_hashes, total)
+        self.pairs.add_hashed(key_hashes)
+        self.traces.add_hashed(trace_hashes)
+        if concurrent:
+            self.total_concurrent += concurrent
+            self.concurrent_counts.add_hashed(key_hashes, concurrent)
+
+        evicted = self.heavy_pairs.add(key, total)
+        if evicted is not None:
+            self.pair_traces.pop(evicted, None)
+        if key not in self.pair_traces:
+            self.pair_traces[key] = HyperLogLog(self.pair_trace_precision)
+        self.pair_traces[key].add_hashed(trace_hashes)
+
+    def estimate_pair(self, dm1, dm2):
+        """Approximate (total, concurrent) records for one pair"""
+        key_hashes = hash_item(pair_key(dm1, dm2))
+        return (self.pair_counts.estimate_hashed(key_hashes),
+                self.concurrent_counts.estimate_hashed(key_hashes))
+
+    def top_pairs(self, k=5):
+        """Heavy-hitter pairs with count, error bound and distinct traces"""
+        result = []
+        for key, count, error in self.heavy_pairs.top(k):
+            dm1, dm2 = key.split('|', 1)
+            traces = self.pair_traces.get(key)
+            result.append({
+                'dm1': dm1,
+                'dm2': dm2,
+                'total': count,
+                'error': error,
+                'concurrent': self.estimate_pair(dm1, dm2)[1],
+                'distinct_traces': traces.estimate() if traces is not None else None,
+            })
+        return result
+
+    def merge(self, other):
+        self.pair_counts.merge(other.pair_counts)
+        self.concurrent_counts.merge(other.concurrent_counts)
+        self.traces.merge(other.traces)
+        self.pairs.merge(other.pairs)
+        self.heavy_pairs.merge(other.heavy_pairs)
+        for key, traces in other.pair_traces.items():
+            if key in self.pair_traces:
+                self.pair_traces[key].merge(traces)
+            else:
+                self.pair_traces[key] = traces
+        self.pair_traces = {key: self.pair_traces[key]
+                            for key in self.heavy_pairs.counters if key in self.pair_traces}
+        self.total_records += other.total_records
+        self.total_concurrent += other.total_concurrent
+        return self
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def print_summary(sketch, top=10):
+    """Print the sketch's global estimates and heaviest pairs"""
+    total = sketch.total_records
+    print(f"   • Unique sibling pairs (approx.): {sketch.pairs.estimate():,}")
+    print(f"   • Distinct traces (approx.): {sketch.traces.estimate():,}")
+    print(f"   • Total records: {total:,}")
+    if total:
+        concurrent = sketch.total_concurrent
+        print(f"   • Parallel executions: {concurrent:,} ({concurrent/total*100:.1f}%)")
+        print(f"   • Sequential executions: {total - concurrent:,} ({(total - concurrent)/total*100:.1f}%)")
+    print(f"   • Top {top} sibling pairs:")
+    for pair in sketch.top_pairs(top):
+        print(f"      • {pair['dm1']}-{pair['dm2']}: {pair['total']:,} total (±{pair['error']:,}), "
+              f"{pair['concurrent']:,} concurrent, ~{pair['distinct_traces']:,} traces")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge and inspect sibling pair sketches')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    merge_parser = subparsers.add_parser('merge', help='Merge several sketch files into one')
+    merge_parser.add_argument('inputs', nargs='+', help='Sketch files (.pkl)')
+    merge_parser.add_argument('-o', '--output', required=True, help='Merged sketch path')
+    summary_parser = subparsers.add_parser('summary', help='Print a sketch summary')
+    summary_parser.add_argument('input', help='Sketch file (.pkl)')
+    summary_parser.add_argument('--top', type=int, default=10, help='Number of heavy pairs to show')
+    args = parser.parse_args()
+
+    if args.command == 'merge':
+        merged = PairSketch.load(args.inputs[0])
+        for path in args.inputs[1:]:
+            merged.merge(PairSketch.load(path))
+        merged.save(args.output)
+        print(f"Merged {len(args.inputs)} sketches into {args.output}")
+        print_summary(merged)
+    elif args.command == 'summary':
+        print_summary(PairSketch.load(args.input), top=args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
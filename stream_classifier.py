@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Online sibling execution-order classifier over live CallGraph records.
+
+Consumes CallGraph-shaped CSV lines (with header) from stdin, a named pipe,
+a TCP or Unix socket, or a paced replay of a CSV file. A regular file given
+as stdin or --pipe is read like an unpaced replay. Every finished call is
+compared with the calls already seen under the same (traceid, um, parent
+rpcid); each sibling pair is emitted as soon as its second call arrives,
+using the same record schema as output/siblings.
+
+Per-trace state is bounded: traces idle for longer than --ttl (in trace
+time) or beyond --max-traces are evicted oldest-first. Rolling per-pair
+concurrent/sequential counts and latency percentiles are reported to stderr.
+"""
+
+import os
+import sys
+import csv
+import stat
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict, deque
+
+from sibling_identifier import SIBLING_FIELDNAMES, analyze_execution_order, create_record, parse_rpcid
+
+
+class StreamingSiblingClassifier:
+    def __init__(self, ttl_ms=60 * 1000, max_traces=100000, max_group_size=256):
+        """Initialize bounded per-trace state"""
+        self.ttl_ms = ttl_ms
+        self.max_traces = max_traces
+        self.max_group_size = max_group_size
+        # traceid -> {'last_seen': ts, 'groups': {(um, prefix): [call, ...]}}
+        self.traces = OrderedDict()
+        self.watermark = None
+        self.pair_counts = {}
+        self.latencies = deque(maxlen=10000)
+        self.stats = {'records': 0, 'skipped': 0, 'pairs': 0, 'evicted': 0}
+
+    def process_record(self, row):
+        """Classify one finished call and return the sibling records it completes"""
+        started = time.perf_counter()
+        try:
+            call = {
+                'dm': row['dm'],
+                'dminstanceid': row['dminstanceid'],
+                'uminstanceid': row['uminstanceid'],
+                'timestamp': int(float(row['timestamp'])),
+                'rt': float(row['rt']),
+            }
+            rpcid = row['rpcid']
+            traceid = row['traceid']
+            um = row['um']
+        except (KeyError, TypeError, ValueError):
+            self.stats['skipped'] += 1
+            return []
+
+        # Same filters as preprocessing: RPC calls with non-zero latency only,
+        # and like the batch modes, none without a traceid or um
+        if row.get('rpctype', 'rpc') != 'rpc' or call['rt'] == 0 or not traceid or not um:
+            self.stats['skipped'] += 1
+            return []
+        self.stats['records'] += 1
+
+        trace = self.traces.get(traceid)
+        if trace is None:
+            trace = {'last_seen': call['timestamp'], 'groups': {}}
+            self.traces[traceid] = trace
+        else:
+            self.traces.move_to_end(traceid)
+            trace['last_seen'] = max(trace['last_seen'], call['timestamp'])
+
+        prefix, _ = parse_rpcid(rpcid)
+        siblings = trace['groups'].setdefault((um, prefix), [])
+
+        records = []
+        for sibling in siblings:
+            if sibling['dm'] != call['dm']:  # Different downstream services
+                execution_order = analyze_execution_order(sibling, call)
+                record = create_record(traceid, prefix, um, sibling, call, execution_order)
+                records.append(record)
+
+                counts = self.pair_counts.setdefault((record['dm1'], record['dm2']),
+                                                     {'concurrent': 0, 'sequential': 0})
+                counts[execution_order] += 1
+        if len(siblings) < self.max_group_size:
+            siblings.append(call)
+        self.stats['pairs'] += len(records)
+
+        if self.watermark is None or call['timestamp'] > self.watermark:
+            self.watermark = call['timestamp']
+        self.evict()
+
+        self.latencies.append(time.perf_counter() - started)
+        return records
+
+    def evict(self):
+        """Drop traces idle past the TTL, then the oldest beyond max_traces"""
+        while self.traces:
+            traceid, trace = next(iter(self.traces.items()))
+            expired = trace['last_seen'] < self.watermark - self.ttl_ms
+            if not expired and len(self.traces) <= self.max_traces:
+                break
+            del self.traces[traceid]
+            self.stats['evicted'] += 1
+
+    def snapshot(self, top=5):
+        """Summarize counters, per-pair tallies and latency percentiles"""
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1e6, 1)
+
+        top_pairs = sorted(self.pair_counts.items(),
+                           key=lambda item: item[1]['concurrent'] + item[1]['sequential'],
+                           reverse=True)[:top]
+        return {
+            **self.stats,
+            'active_traces': len(self.traces),
+            'tracked_pairs': len(self.pair_counts),
+            'latency_p50_us': percentile(0.50),
+            'latency_p99_us': percentile(0.99),
+            'top_pairs': [{'dm1': dm1, 'dm2': dm2, **counts} for (dm1, dm2), counts in top_pairs],
+        }
+
+
+async def read_lines(reader):
+    """Yield decoded lines from an asyncio StreamReader"""
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        yield line.decode('utf-8', errors='replace')
+
+
+async def file_lines(f, rate=None):
+    """Yield lines of an open text file, optionally paced at `rate` records per second"""
+    started = time.perf_counter()
+    for count, line in enumerate(f):
+        if rate:
+            delay = started + count / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % 1000 == 0:
+            # Let the stats task run during an unpaced replay
+            await asyncio.sleep(0)
+        yield line
+
+
+async def replay_lines(path, rate=None):
+    """Yield lines of a CSV file, optionally paced at `rate` records per second"""
+    with open(path, newline='') as f:
+        async for line in file_lines(f, rate):
+            yield line
+
+
+def is_regular_file(fd):
+    """Regular files cannot back an asyncio pipe transport"""
+    return stat.S_ISREG(os.fstat(fd).st_mode)
+
+
+async def consume(lines, classifier, writer, output):
+    """Parse CSV lines (first line is the header) and emit sibling records"""
+    header = None
+    async for line in lines:
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            # The raw trace names the column rpc_id; Casper output uses rpcid
+            header = ['rpcid' if name == 'rpc_id' else name for name in header]
+            continue
+        for record in classifier.process_record(dict(zip(header, values))):
+            writer.writerow(record)
+        output.flush()
+
+
+async def report_stats(classifier, interval):
+    """Periodically print a JSON stats snapshot to stderr"""
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps(classifier.snapshot()), file=sys.stderr, flush=True)
+
+
+async def stdin_lines():
+    """Lines of stdin: pipes and terminals through asyncio, redirected files directly"""
+    if is_regular_file(sys.stdin.fileno()):
+        return file_lines(sys.stdin)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 20)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    return read_lines(reader)
+
+
+async def pipe_lines(path):
+    """Lines of a named pipe through asyncio; a regular file is replayed unpaced"""
+    pipe = open(path, 'rb', buffering=0)
+    if is_regular_file(pipe.fileno()):
+        pipe.close()
+        return replay_lines(path)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 20)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return read_lines(reader)
+
+
+async def run(args):
+    classifier = StreamingSiblingClassifier(ttl_ms=args.ttl, max_traces=args.max_traces,
+                                            max_group_size=args.max_group_size)
+    output = sys.stdout
+    writer = csv.DictWriter(output, fieldnames=SIBLING_FIELDNAMES, lineterminator='\n')
+    writer.writeheader()
+    stats_task = asyncio.create_task(report_stats(classifier, args.stats_interval))
+
+    try:
+        if args.listen or args.unix_socket:
+            async def handle_connection(reader, _writer):
+                await consume(read_lines(reader), classifier, writer, output)
+                _writer.close()
+
+            if args.unix_socket:
+                server = await asyncio.start_unix_server(handle_connection, path=args.unix_socket)
+            else:
+                host, port = args.listen.rsplit(':', 1)
+                server = await asyncio.start_server(handle_connection, host, int(port))
+            print(f"Listening on {args.unix_socket or args.listen}", file=sys.stderr, flush=True)
+            async with server:
+                await server.serve_forever()
+        elif args.replay:
+            await consume(replay_lines(args.replay, args.rate), classifier, writer, output)
+        elif args.pipe:
+            await consume(await pipe_lines(args.pipe), classifier, writer, output)
+        else:
+            await consume(await stdin_lines(), classifier, writer, output)
+    finally:
+        stats_task.cancel()
+        print(json.dumps(classifier.snapshot()), file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming sibling execution-order classifier')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--replay', help='Replay a CallGraph CSV file')
+    source.add_argument('--pipe', help='Read from a named pipe (or a regular file)')
+    source.add_argument('--listen', help='Accept TCP connections on HOST:PORT')
+    source.add_argument('--unix-socket', help='Accept connections on a Unix socket path')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Replay pace in records per second (default: as fast as possible)')
+    parser.add_argument('--ttl', type=int, default=60 * 1000,
+                        help='Evict traces idle for this many ms of trace time')
+    parser.add_argument('--max-traces', type=int, default=100000,
+                        help='Maximum number of traces held in memory')
+    parser.add_argument('--max-group-size', type=int, default=256,
+                        help='Maximum calls kept per (trace, um, parent rpcid) group')
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help='Seconds between stats snapshots on stderr')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The analysis scripts live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_callgraph(n_traces=60, seed=3):
+    """Synthetic CallGraph rows: nested rpcids, repeated dms, overlapping and sequential calls"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for t in range(n_traces):
+        traceid = f'T_{t}'
+        base = int(rng.integers(0, 100000))
+        parents = [('0', 'MS_root')]
+        for _ in range(int(rng.integers(1, 4))):
+            prefix, um = parents[int(rng.integers(len(parents)))]
+            for child in range(int(rng.integers(1, 7))):
+                dm = f'MS_{int(rng.integers(0, 5))}'
+                rpcid = f'{prefix}.{child + 1}'
+                start = base + int(rng.integers(0, 60))
+                rows.append({
+                    'traceid': traceid, 'timestamp': start, 'rpcid': rpcid, 'um': um, 'rpctype': 'rpc',
+                    'dm': dm, 'interface': 'if', 'rt': int(rng.integers(1, 30)),
+                    'uminstanceid': f'{um}_POD_0', 'dminstanceid': f'{dm}_POD_{int(rng.integers(0, 3))}',
+                })
+                parents.append((rpcid, dm))
+    return pd.DataFrame(rows).sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+@pytest.fixture
+def callgraph_folder(tmp_path):
+    """Folder holding two CallGraph CSV files (whole traces in each)"""
+    folder = tmp_path / 'callgraph'
+    folder.mkdir()
+    df = make_callgraph()
+    first = df['traceid'].isin([f'T_{t}' for t in range(30)])
+    df[first].to_csv(folder / 'CallGraph_0.csv', index=False)
+    df[~first].to_csv(folder / 'CallGraph_1.csv', index=False)
+    return folder
+
+
+def read_sibling_dir(path):
+    """All rows of a sibling output directory as strings, sorted for order-insensitive comparison"""
+    frames = [pd.read_csv(os.path.join(path, name), dtype=str) for name in sorted(os.listdir(path))]
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def run_batch(folder, output_dir, **kwargs):
+    """Run SimpleSiblingAnalyzer over a folder and return its sibling output directory"""
+    from sibling_identifier import SimpleSiblingAnalyzer
+    analyzer = SimpleSiblingAnalyzer(str(folder), **kwargs)
+    analyzer.run_analysis(output_dir=str(output_dir))
+    return os.path.join(str(output_dir), analyzer.sibling_subdir)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from asof_join import JOIN_MODES, TIMESTAMP_MAX, asof_lookup, build_sort_key, load_columnar_index
+from build_index import build_columnar_index
+
+WINDOW = 150
+
+
+def brute_force(samples, key, ts, mode, window):
+    """Reference as-of join by scanning one key's samples"""
+    rows = samples[samples['msname'] == key].sort_values('timestamp')
+    if np.isnan(ts) or rows.empty:
+        return np.nan, np.nan, None
+    before = rows[(rows['timestamp'] <= ts) & (ts - rows['timestamp'] <= window)]
+    after = rows[(rows['timestamp'] >= ts) & (rows['timestamp'] - ts <= window)]
+    left = before.iloc[-1] if len(before) else None
+    right = after.iloc[0] if len(after) else None
+    if mode == 'backward':
+        right = None
+    elif mode == 'forward':
+        left = None
+
+    if left is not None and right is not None:
+        left_dist, right_dist = ts - left['timestamp'], right['timestamp'] - ts
+        nearest, lag = (left, left_dist) if left_dist <= right_dist else (right, right_dist)
+        value = nearest['cpu']
+        if mode == 'linear' and left_dist + right_dist > 0:
+            value = left['cpu'] + (right['cpu'] - left['cpu']) * left_dist / (left_dist + right_dist)
+        return value, lag, nearest['nodeid']
+    if left is not None:
+        return left['cpu'], ts - left['timestamp'], left['nodeid']
+    if right is not None:
+        return right['cpu'], right['timestamp'] - ts, right['nodeid']
+    return np.nan, np.nan, None
+
+
+@pytest.fixture(scope='module')
+def samples():
+    rng = np.random.default_rng(7)
+    frames = []
+    for i, key in enumerate(['MS_a', 'MS_b', 'MS_c']):
+        timestamps = np.sort(rng.choice(np.arange(0, 2000, 10), size=40, replace=False))
+        frames.append(pd.DataFrame({
+            'timestamp': timestamps,
+            'msname': key,
+            'cpu': rng.random(len(timestamps)),
+            'nodeid': [f'NODE_{i}_{j % 3}' for j in range(len(timestamps))],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['loaded', 'sliced'])
+def index(request, samples, tmp_path_factory):
+    folder = tmp_path_factory.mktemp('metrics')
+    index_dir = build_columnar_index(str(folder), 'msname', ['cpu'], label_columns=['nodeid'], frame=samples)
+    return load_columnar_index(index_dir, slices=request.param)
+
+
+@pytest.mark.parametrize('mode', JOIN_MODES)
+def test_modes_match_brute_force(samples, index, mode):
+    rng = np.random.default_rng(11)
+    keys = list(rng.choice(['MS_a', 'MS_b', 'MS_c', 'MS_unknown'], size=300))
+    timestamps = rng.integers(-300, 2400, size=300).astype(np.float64)
+    timestamps[::25] = np.nan
+
+    values, lag = asof_lookup(index, keys, timestamps, mode=mode, window=WINDOW, columns=['cpu', 'nodeid'])
+
+    for i, (key, ts) in enumerate(zip(keys, timestamps)):
+        value, expected_lag, node = brute_force(samples, key, ts, mode, WINDOW)
+        np.testing.assert_allclose(values['cpu'][i], value, equal_nan=True, err_msg=f"{key} @ {ts}")
+        np.testing.assert_allclose(lag[i], expected_lag, equal_nan=True, err_msg=f"{key} @ {ts}")
+        assert values['nodeid'][i] == node
+
+
+def test_negative_query_does_not_match_previous_key(samples, index):
+    # A negative timestamp must not borrow the trailing samples of the key before it
+    values, lag = asof_lookup(index, ['MS_b'], [-1.0], mode='backward', window=10**9)
+    assert np.isnan(values['cpu'][0]) and np.isnan(lag[0])
+
+
+def test_sort_key_rejects_out_of_range_timestamps():
+    offsets = np.array([0, 2])
+    with pytest.raises(ValueError):
+        build_sort_key(offsets, np.array([-5, 10]))
+    with pytest.raises(ValueError):
+        build_sort_key(offsets, np.array([0, TIMESTAMP_MAX + 1]))
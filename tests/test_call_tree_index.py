@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from call_tree_index import CallTreeIndex, build_call_tree_index
+from conftest import make_callgraph
+from sibling_identifier import parse_rpcid
+
+
+@pytest.fixture(scope='module')
+def built(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('callgraph')
+    df = make_callgraph(n_traces=25, seed=12)
+    # A repeated rpcid: the parent pointer goes to its first row
+    df = pd.concat([df, df.iloc[[5]]], ignore_index=True)
+    df.to_csv(folder / 'CallGraph_0.csv', index=False)
+    index = CallTreeIndex(build_call_tree_index(str(folder), str(folder / 'call_tree.npz')))
+    return df, index
+
+
+def test_traces_round_trip(built):
+    df, index = built
+    for traceid, calls in df.groupby('traceid'):
+        trace = index.trace(traceid)
+        expected = sorted(zip(calls['rpcid'], calls['um'], calls['dm'], calls['timestamp']))
+        assert sorted(zip(trace['rpcid'], trace['um'], trace['dm'], trace['timestamp'])) == expected
+    assert index.trace('T_missing').empty
+
+
+def test_parent_pointers(built):
+    df, index = built
+    for traceid in df['traceid'].unique():
+        trace = index.trace(traceid)
+        rpcids = list(trace['rpcid'])
+        for row, rpcid, parent in zip(trace['row'], rpcids, trace['parent']):
+            prefix, _ = parse_rpcid(rpcid)
+            expected = rpcids.index(prefix) if prefix in rpcids and prefix != rpcid else -1
+            assert parent == expected, (traceid, rpcid)
+            assert trace['depth'][row] == rpcid.count('.')
+
+
+def test_children(built):
+    df, index = built
+    for traceid in df['traceid'].unique()[:10]:
+        trace = index.trace(traceid)
+        for rpcid in trace['rpcid'].unique():
+            expected = sorted(r for r in trace['rpcid'] if r != rpcid and parse_rpcid(r)[0] == rpcid)
+            assert sorted(index.children(traceid, rpcid)['rpcid']) == expected
+
+
+@pytest.mark.parametrize('level', [1, 2])
+def test_depth_k_siblings(built, level):
+    df, index = built
+    checked = 0
+    for traceid in df['traceid'].unique():
+        trace = index.trace(traceid)
+        for rpcid in trace['rpcid'].unique():
+            depth = rpcid.count('.')
+            if level > depth:
+                with pytest.raises(ValueError):
+                    index.siblings(traceid, rpcid, level=level)
+                continue
+            ancestor = '.'.join(rpcid.split('.')[:depth + 1 - level])
+            expected = sorted(r for r in trace['rpcid']
+                              if r != rpcid and r.count('.') == depth and r.startswith(ancestor + '.'))
+            assert sorted(index.siblings(traceid, rpcid, level=level)['rpcid']) == expected
+            checked += 1
+    assert checked > 0
+
+
+def test_levels_outside_the_tree_are_rejected(built):
+    _, index = built
+    for level in (0, 3, 10):
+        with pytest.raises(ValueError):
+            index.siblings('T_0', '0.1.1', level=level)
+
+
+def test_critical_path(built):
+    df, index = built
+    for traceid in df['traceid'].unique():
+        trace = index.trace(traceid)
+        finish = (trace['timestamp'] + trace['rt']).values
+        path = list(index.critical_path(traceid)['row'])
+        assert path
+        previous = -1
+        for row in path:
+            # Each step is the latest-finishing child of the previous one
+            children = np.flatnonzero(trace['parent'].values == previous)
+            assert row in children and finish[row] == finish[children].max()
+            previous = row
+        assert not (trace['parent'].values == previous).any()
@@ -0,0 +1,50 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from asof_join import load_columnar_index
+from build_index import build_columnar_index
+from conftest import run_batch
+from contextual_gather_optimized import (COMPACT_COLUMNS, enrich_columns, enrich_dataframe,
+                                         read_csv_columns, write_csv_columns)
+from pair_statistics import PAIR_KEY, build_contingency_tables
+
+
+@pytest.fixture
+def indexes(tmp_path):
+    """Service-level metrics and MCR indexes sampled every 10ms over the synthetic traces"""
+    timestamps = np.arange(0, 101000, 10)
+    frames = [pd.DataFrame({'timestamp': timestamps, 'msname': f'MS_{i}'}) for i in range(5)]
+    samples = pd.concat(frames, ignore_index=True)
+    rng = np.random.default_rng(5)
+    samples['cpu_utilization'] = rng.random(len(samples))
+    samples['memory_utilization'] = rng.random(len(samples))
+    samples['providerrpc_mcr'] = rng.random(len(samples))
+    metrics = build_columnar_index(str(tmp_path / 'metrics'), 'msname',
+                                   ['cpu_utilization', 'memory_utilization'], frame=samples)
+    mcr = build_columnar_index(str(tmp_path / 'mcr'), 'msname', ['providerrpc_mcr'], frame=samples)
+    return load_columnar_index(metrics), load_columnar_index(mcr)
+
+
+def test_compact_tallies_survive_enrichment(callgraph_folder, tmp_path, indexes):
+    full_files = sorted(glob.glob(os.path.join(run_batch(callgraph_folder, tmp_path / 'full'), '*.csv')))
+    compact_dir = run_batch(callgraph_folder, tmp_path / 'compact', compact=True)
+
+    enriched_files = []
+    for i, sibling_file in enumerate(sorted(glob.glob(os.path.join(compact_dir, '*.csv')))):
+        df = pd.read_csv(sibling_file)
+        enriched = enrich_dataframe(df, *indexes)
+        assert enriched[COMPACT_COLUMNS].equals(df[COMPACT_COLUMNS])
+        assert enriched['dm1_cpu'].notna().all()
+        # The pandas-free small-input path writes the same tallies
+        small_path = str(tmp_path / f'contextual_{i}.csv')
+        write_csv_columns(enrich_columns(read_csv_columns(sibling_file), *indexes), small_path)
+        assert pd.read_csv(small_path)[COMPACT_COLUMNS].equals(df[COMPACT_COLUMNS])
+        enriched_files.append(small_path)
+
+    full = build_contingency_tables(full_files, max_workers=1).sort_values(PAIR_KEY + ['um'])
+    compact = build_contingency_tables(enriched_files, max_workers=1).sort_values(PAIR_KEY + ['um'])
+    pd.testing.assert_frame_equal(compact.reset_index(drop=True), full.reset_index(drop=True))
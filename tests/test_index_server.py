@@ -0,0 +1,159 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import index_server
+from asof_join import asof_lookup, load_columnar_index
+from build_index import build_columnar_index
+from index_server import (INDEX_DIRS, IndexServer, SharedIndexes, attach_block, attach_indexes,
+                          remote_lookup, request)
+
+
+@pytest.fixture
+def index_base(tmp_path):
+    """Service and instance metric indexes in the INDEX_DIRS layout"""
+    rng = np.random.default_rng(11)
+    rows = []
+    for s in range(4):
+        for pod in range(2):
+            timestamps = np.sort(rng.choice(np.arange(0, 6000, 30), size=50, replace=False))
+            rows.append(pd.DataFrame({
+                'timestamp': timestamps, 'msname': f'MS_{s}', 'msinstanceid': f'MS_{s}_POD_{pod}',
+                'nodeid': f'NODE_{(s + pod) % 3}',
+                'cpu_utilization': rng.random(len(timestamps)),
+                'memory_utilization': rng.random(len(timestamps)),
+            }))
+    samples = pd.concat(rows, ignore_index=True)
+    base = tmp_path / 'data'
+    folder = str(base / 'MSMetrics')
+    build_columnar_index(folder, 'msname', ['cpu_utilization', 'memory_utilization'], frame=samples)
+    build_columnar_index(folder, 'msinstanceid', ['cpu_utilization', 'memory_utilization'],
+                         label_columns=['nodeid'], frame=samples)
+    return str(base)
+
+
+@pytest.fixture
+def server(index_base, tmp_path):
+    """A running IndexServer on a temporary socket"""
+    shared = SharedIndexes(index_base)
+    shared.load()
+    socket_path = str(tmp_path / 'ix.sock')
+    server = IndexServer(socket_path, shared)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, socket_path
+    server.shutdown()
+    server.server_close()
+    shared.close()
+
+
+def queries():
+    keys = ['MS_0', 'MS_1', 'MS_3', 'MS_missing', 'MS_2'] * 20
+    timestamps = np.linspace(-100, 6500, len(keys))
+    return keys, timestamps
+
+
+def instance_queries():
+    keys = ['MS_0_POD_0', 'MS_2_POD_1', 'MS_missing_POD_0', 'MS_3_POD_0'] * 20
+    timestamps = np.linspace(-100, 6500, len(keys))
+    return keys, timestamps
+
+
+def assert_same_lookup(actual, expected):
+    values, lag = actual
+    expected_values, expected_lag = expected
+    assert set(values) == set(expected_values)
+    for col, data in expected_values.items():
+        if data.dtype == object:
+            assert list(values[col]) == list(data)
+        else:
+            np.testing.assert_array_equal(np.asarray(values[col], dtype=np.float64), data)
+    np.testing.assert_array_equal(lag, expected_lag)
+
+
+@pytest.mark.parametrize('mode', ['nearest', 'backward', 'linear'])
+def test_attached_and_remote_lookups_match_full_load(server, index_base, mode):
+    _, socket_path = server
+    attached = attach_indexes(socket_path)
+    for name, make_queries, columns in (('metrics', queries, None),
+                                        ('instance_metrics', instance_queries, ['cpu_utilization', 'nodeid'])):
+        if mode == 'linear' and columns:
+            columns = ['cpu_utilization']
+        full = load_columnar_index(os.path.join(index_base, INDEX_DIRS[name]))
+        keys, timestamps = make_queries()
+        expected = asof_lookup(full, keys, timestamps, mode=mode, window=200, columns=columns)
+        assert_same_lookup(asof_lookup(attached[name], keys, timestamps, mode=mode, window=200,
+                                       columns=columns), expected)
+        assert_same_lookup(remote_lookup(socket_path, name, keys, timestamps, mode=mode, window=200,
+                                         columns=columns), expected)
+
+
+def test_lookups_run_concurrently(server, monkeypatch):
+    _, socket_path = server
+    # Each lookup waits inside asof_lookup until the other one has entered it too
+    both_inside = threading.Barrier(2, timeout=10)
+    lookup = index_server.asof_lookup
+
+    def waiting_lookup(*args, **kwargs):
+        both_inside.wait()
+        return lookup(*args, **kwargs)
+
+    monkeypatch.setattr(index_server, 'asof_lookup', waiting_lookup)
+    keys, timestamps = queries()
+    errors = []
+
+    def client():
+        try:
+            remote_lookup(socket_path, 'metrics', keys, timestamps)
+        except Exception as e:
+            errors.append(e)
+
+    clients = [threading.Thread(target=client) for _ in range(2)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    assert errors == []
+
+
+def test_reload_keeps_attached_clients_valid(server, index_base):
+    server, socket_path = server
+    attached = attach_indexes(socket_path)
+    old_blocks = [spec['shm'] for spec in
+                  request(socket_path, {'op': 'describe'})['indexes']['metrics']['arrays'].values()]
+    keys, timestamps = queries()
+    before = asof_lookup(attached['metrics'], keys, timestamps)
+
+    assert request(socket_path, {'op': 'reload'})['generation'] == 2
+    # The old names are gone, but the attached mappings still read the same data
+    with pytest.raises(FileNotFoundError):
+        attach_block(old_blocks[0])
+    assert_same_lookup(asof_lookup(attached['metrics'], keys, timestamps), before)
+    assert_same_lookup(asof_lookup(attach_indexes(socket_path)['metrics'], keys, timestamps), before)
+    assert_same_lookup(remote_lookup(socket_path, 'metrics', keys, timestamps), before)
+
+
+def test_reload_waits_for_lookups_using_the_old_generation(index_base):
+    shared = SharedIndexes(index_base)
+    shared.load()
+    try:
+        keys, timestamps = queries()
+        with shared.use() as pinned:
+            block_name = pinned.blocks[0].name
+            # A reload (from another thread) must not hold the lookup up or free its blocks
+            reload = threading.Thread(target=shared.load)
+            reload.start()
+            reload.join(timeout=30)
+            assert not reload.is_alive()
+            assert shared.current is not pinned and pinned.retired
+            attach_block(block_name).close()
+            asof_lookup(pinned.indexes['metrics'], keys, timestamps)
+        # The last user of a retired generation releases its blocks
+        with pytest.raises(FileNotFoundError):
+            attach_block(block_name)
+        assert shared.current.number == 2
+    finally:
+        shared.close()
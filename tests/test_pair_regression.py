@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from pair_regression import FEATURES, GROUP_KEYS, run_batch_regression
+
+
+def contextual_files(tmp_path):
+    """Two contextual files with a load effect that differs by um, and rows missing dm2"""
+    rng = np.random.default_rng(4)
+    paths = []
+    for um, slope in (('U1', 2.0), ('U2', -3.0)):
+        n = 120
+        cpu = rng.random(n)
+        concurrent = rng.random(n) < 1 / (1 + np.exp(-slope * (cpu - 0.5) * 4))
+        df = pd.DataFrame({
+            'um': um, 'dm1': 'MS_a', 'dm2': 'MS_b',
+            'execution_order': np.where(concurrent, 'concurrent', 'sequential'),
+            'dm1_cpu': cpu, 'dm1_memory': rng.random(n), 'dm1_mcr': rng.random(n),
+        })
+        df.loc[df.index[::6], 'dm2'] = None
+        path = tmp_path / f'contextual_{um}.csv'
+        df.to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def reference_fit(df):
+    X = StandardScaler().fit_transform(df[FEATURES].values)
+    y = (df['execution_order'] == 'concurrent').astype(int).values
+    model = LogisticRegression().fit(X, y)
+    return len(df), int(y.sum()), model.coef_[0]
+
+
+def test_groups_match_individual_fits(tmp_path):
+    paths = contextual_files(tmp_path)
+    for group_by, keys in GROUP_KEYS.items():
+        results = run_batch_regression(paths, group_by=group_by, output_csv=str(tmp_path / f'{group_by}.csv'),
+                                       max_workers=1)
+        data = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+        data['dm1_system_load'] = 0.7 * data['dm1_cpu'] + 0.3 * data['dm1_memory']
+        data = data.dropna(subset=keys)
+        assert len(results) == data.groupby(keys).ngroups
+        for _, row in results.iterrows():
+            group = data[(data[keys] == row[keys]).all(axis=1)]
+            n, n_concurrent, coefs = reference_fit(group)
+            assert (row['n'], row['n_concurrent'], row['status']) == (n, n_concurrent, 'ok')
+            for feature, coef in zip(FEATURES, coefs):
+                assert np.isclose(row[f'coef_{feature}'], coef)
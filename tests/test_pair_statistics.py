@@ -0,0 +1,104 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from conftest import run_batch
+from pair_statistics import (PAIR_KEY, adjust_pvalues, build_contingency_tables, chi_square_tests,
+                             fisher_tests, mann_whitney_tests)
+
+
+@pytest.fixture
+def tables():
+    """Contingency rows for pairs with 2 (Yates), 3 and 5 ums"""
+    rng = np.random.default_rng(1)
+    rows = []
+    for pair, num_ums in (('A', 2), ('B', 3), ('C', 5), ('D', 2)):
+        for u in range(num_ums):
+            rows.append({'dm1': f'MS_{pair}1', 'dm2': f'MS_{pair}2', 'um': f'U{u}',
+                         'concurrent': int(rng.integers(1, 40)), 'sequential': int(rng.integers(1, 40))})
+    return pd.DataFrame(rows)
+
+
+def pair_tables(tables):
+    for (dm1, dm2), group in tables.groupby(PAIR_KEY, sort=False):
+        yield dm1, dm2, group[['concurrent', 'sequential']].values
+
+
+def test_chi_square_matches_scipy(tables):
+    results = chi_square_tests(tables).set_index(PAIR_KEY)
+    for dm1, dm2, observed in pair_tables(tables):
+        chi2, p, dof, _ = stats.chi2_contingency(observed)
+        row = results.loc[(dm1, dm2)]
+        assert row['chi2_dof'] == dof
+        assert row['chi2'] == pytest.approx(chi2)
+        assert row['chi2_p'] == pytest.approx(p)
+        assert row['total_observations'] == observed.sum()
+
+
+def test_fisher_matches_scipy(tables):
+    results = fisher_tests(tables, max_workers=1).set_index(PAIR_KEY)
+    two_by_two = [(dm1, dm2, observed) for dm1, dm2, observed in pair_tables(tables) if len(observed) == 2]
+    assert set(results.index) == {(dm1, dm2) for dm1, dm2, _ in two_by_two}
+    for dm1, dm2, observed in two_by_two:
+        odds, p = stats.fisher_exact(observed)
+        assert results.loc[(dm1, dm2), 'fisher_odds_ratio'] == pytest.approx(odds)
+        assert results.loc[(dm1, dm2), 'fisher_p'] == pytest.approx(p)
+
+
+def test_mann_whitney_matches_scipy():
+    rng = np.random.default_rng(2)
+    frames = []
+    for pair, shift in (('A', 0.0), ('B', 1.5), ('C', 0.3)):
+        n = 60
+        frames.append(pd.DataFrame({
+            'dm1': f'MS_{pair}1', 'dm2': f'MS_{pair}2',
+            'execution_order': rng.choice(['concurrent', 'sequential'], size=n),
+            # Rounded values give plenty of ties
+            'load': np.round(rng.normal(size=n) + shift * np.arange(n) / n, 1),
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    results = mann_whitney_tests(df, 'load', 'mwu').set_index(PAIR_KEY)
+    for (dm1, dm2), group in df.groupby(PAIR_KEY):
+        concurrent = group.loc[group['execution_order'] == 'concurrent', 'load']
+        sequential = group.loc[group['execution_order'] == 'sequential', 'load']
+        u, p = stats.mannwhitneyu(concurrent, sequential, alternative='two-sided',
+                                  use_continuity=True, method='asymptotic')
+        assert results.loc[(dm1, dm2), 'mwu_u'] == pytest.approx(u)
+        assert results.loc[(dm1, dm2), 'mwu_p'] == pytest.approx(p)
+
+
+def test_adjust_pvalues():
+    p = np.array([0.01, np.nan, 0.04, 0.03, 0.2, 0.5, 0.001])
+    valid = ~np.isnan(p)
+    bh = adjust_pvalues(p, method='fdr_bh')
+    np.testing.assert_allclose(bh[valid], stats.false_discovery_control(p[valid], method='bh'))
+    bonferroni = adjust_pvalues(p, method='bonferroni')
+    np.testing.assert_allclose(bonferroni[valid], np.minimum(p[valid] * valid.sum(), 1.0))
+    assert np.isnan(bh[1]) and np.isnan(bonferroni[1])
+    with pytest.raises(ValueError):
+        adjust_pvalues(p, method='holm')
+
+
+def test_contingency_tables_from_sibling_files(tmp_path):
+    rows = [('U1', 'concurrent')] * 3 + [('U1', 'sequential')] * 2 + [('U2', 'sequential')] * 4
+    df = pd.DataFrame([{'um': um, 'dm1': 'MS_a', 'dm2': 'MS_b', 'execution_order': order}
+                       for um, order in rows])
+    df.to_csv(tmp_path / 'sibling_MS_a_MS_b.csv', index=False)
+    tables = build_contingency_tables([str(tmp_path / 'sibling_MS_a_MS_b.csv')], max_workers=1)
+    counts = tables.set_index('um')[['concurrent', 'sequential']]
+    assert counts.loc['U1'].tolist() == [3, 2]
+    assert counts.loc['U2'].tolist() == [0, 4]
+
+
+def test_compact_siblings_give_full_mode_tables(callgraph_folder, tmp_path):
+    tables = {}
+    for mode, compact in (('full', False), ('compact', True)):
+        sibling_dir = run_batch(callgraph_folder, tmp_path / mode, compact=compact)
+        files = sorted(glob.glob(os.path.join(sibling_dir, '*.csv')))
+        tables[mode] = build_contingency_tables(files, max_workers=1).sort_values(PAIR_KEY + ['um'])
+    pd.testing.assert_frame_equal(tables['compact'].reset_index(drop=True),
+                                  tables['full'].reset_index(drop=True))
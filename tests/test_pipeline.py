@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from pipeline import build_stages, check_outputs, load_state, run_pipeline, stage
+
+COPY_SCRIPT = '''import sys, shutil, os
+os.makedirs(os.path.dirname(sys.argv[2]), exist_ok=True)
+shutil.copy(sys.argv[1], sys.argv[2])
+'''
+
+
+@pytest.fixture
+def workflow(tmp_path):
+    """Two chained copy stages writing into a results directory shared with other tools"""
+    script = tmp_path / 'copy.py'
+    script.write_text(COPY_SCRIPT)
+    source, middle = tmp_path / 'input.txt', tmp_path / 'work' / 'middle.txt'
+    shared = tmp_path / 'res'
+    shared.mkdir()
+    (shared / 'pair_tests.csv').write_text('written by another tool\n')
+    source.write_text('v1\n')
+    stages = {
+        'first': stage('first', str(script), [str(source), str(middle)],
+                       inputs=[str(source)], outputs=[str(middle)]),
+        'second': stage('second', str(script), [str(middle), str(shared / 'final.txt')],
+                        inputs=[str(middle)], outputs=[str(shared / 'final.txt')], deps=['first']),
+    }
+    return stages, tmp_path
+
+
+def finished_times(state_path):
+    return {name: entry['finished'] for name, entry in load_state(state_path).items()}
+
+
+def test_skip_and_rerun(workflow):
+    stages, root = workflow
+    state_path = str(root / 'state.json')
+
+    assert run_pipeline(stages, state_path=state_path)
+    assert (root / 'res' / 'final.txt').read_text() == 'v1\n'
+    first_run = finished_times(state_path)
+
+    # Nothing changed: both stages are skipped
+    assert run_pipeline(stages, state_path=state_path)
+    assert finished_times(state_path) == first_run
+
+    # A changed input reruns its stage and everything downstream
+    (root / 'input.txt').write_text('v2 changed\n')
+    assert run_pipeline(stages, state_path=state_path)
+    second_run = finished_times(state_path)
+    assert all(second_run[name] > first_run[name] for name in stages)
+    assert (root / 'res' / 'final.txt').read_text() == 'v2 changed\n'
+
+    # Reruns only delete declared outputs, never their shared parent directory
+    assert (root / 'res' / 'pair_tests.csv').read_text() == 'written by another tool\n'
+
+
+def test_missing_output_reruns_stage(workflow):
+    stages, root = workflow
+    state_path = str(root / 'state.json')
+    assert run_pipeline(stages, state_path=state_path)
+    first_run = finished_times(state_path)
+
+    os.remove(root / 'res' / 'final.txt')
+    assert run_pipeline(stages, state_path=state_path)
+    second_run = finished_times(state_path)
+    assert second_run['first'] == first_run['first']
+    assert second_run['second'] > first_run['second']
+
+
+def test_overlapping_outputs_rejected(workflow):
+    stages, root = workflow
+    stages['greedy'] = stage('greedy', stages['first']['command'][1], [],
+                             outputs=[str(root / 'res')])
+    with pytest.raises(ValueError):
+        check_outputs(stages)
+
+
+def test_default_stages(tmp_path):
+    stages = build_stages(output=str(tmp_path), pair=('MS_b', 'MS_a'))
+    res_dir = os.path.join(str(tmp_path), 'res')
+    process = stages['process_siblings']
+    assert res_dir not in process['outputs'] + process['optional_outputs']
+    # The sibling stage's fingerprint covers every module it imports
+    code = {os.path.basename(path) for path in stages['siblings']['code']}
+    assert {'sibling_identifier.py', 'sketches.py', 'external_sort.py', 'csv_filter.py'} <= code
@@ -0,0 +1,76 @@
+import pandas as pd
+
+import sibling_identifier
+from conftest import make_callgraph, read_sibling_dir, run_batch
+from sibling_identifier import SIBLING_FIELDNAMES, find_sibling_pairs, find_sibling_records
+
+GROUP_KEY = ['traceid', 'rpcid', 'um', 'dm1', 'dm2']
+
+
+def test_compact_tallies_match_full_mode(callgraph_folder, tmp_path):
+    full = read_sibling_dir(run_batch(callgraph_folder, tmp_path / 'full'))
+    compact = read_sibling_dir(run_batch(callgraph_folder, tmp_path / 'compact', compact=True))
+
+    concurrent = full['execution_order'] == 'concurrent'
+    expected = (full.assign(concurrent=concurrent.astype(int), sequential=(~concurrent).astype(int))
+                .groupby(GROUP_KEY)[['concurrent', 'sequential']].sum())
+    expected['multiplicity'] = expected['concurrent'] + expected['sequential']
+
+    counts = compact.set_index(GROUP_KEY)[['multiplicity', 'concurrent', 'sequential',
+                                           'dm1_calls', 'dm2_calls']].astype(int)
+    assert counts.index.is_unique
+    pd.testing.assert_frame_equal(counts[['concurrent', 'sequential', 'multiplicity']].sort_index(),
+                                  expected[['concurrent', 'sequential', 'multiplicity']].sort_index())
+    assert (counts['dm1_calls'] * counts['dm2_calls'] == counts['multiplicity']).all()
+
+
+def per_group_records(df):
+    """Reference output of the per-(traceid, um) loop used before vectorization"""
+    records = []
+    for (traceid, um), group in df.groupby(['traceid', 'um']):
+        calls = group[['dm', 'dminstanceid', 'uminstanceid', 'timestamp', 'rt', 'rpcid']].to_dict('records')
+        records.extend(find_sibling_records(traceid, um, calls))
+    return pd.DataFrame(records, columns=SIBLING_FIELDNAMES)
+
+
+def as_sorted_strings(df):
+    df = df.astype(str)
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def test_find_sibling_pairs_matches_per_group_loop():
+    df = make_callgraph(n_traces=120, seed=5)
+    df.loc[df.index[::13], 'um'] = None
+    expected = per_group_records(df.dropna(subset=['um']))
+    actual = find_sibling_pairs(df)
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(as_sorted_strings(actual), as_sorted_strings(expected))
+
+
+def test_batched_writes_match_unbatched(callgraph_folder, tmp_path, monkeypatch):
+    # Fields that need CSV quoting must survive the block writer
+    path = callgraph_folder / 'CallGraph_0.csv'
+    df = pd.read_csv(path)
+    df.loc[df.index[::5], 'dminstanceid'] = 'POD,"quoted"\r\nsplit'
+    df.to_csv(path, index=False)
+
+    unbatched = read_sibling_dir(run_batch(callgraph_folder, tmp_path / 'unbatched'))
+    monkeypatch.setattr(sibling_identifier, 'PAIR_BATCH_CALLS', 7)
+    batched = read_sibling_dir(run_batch(callgraph_folder, tmp_path / 'batched'))
+    assert (unbatched['dminstanceid1'] == 'POD,"quoted"\r\nsplit').any()
+    pd.testing.assert_frame_equal(batched, unbatched)
+
+
+def test_external_sort_matches_full_mode_with_missing_keys(callgraph_folder, tmp_path):
+    # Calls without a traceid or um are dropped by the in-memory groupby
+    for path in callgraph_folder.iterdir():
+        df = pd.read_csv(path)
+        df.loc[df.index[::9], 'traceid'] = None
+        df.loc[df.index[4::11], 'um'] = None
+        df.to_csv(path, index=False)
+
+    full = read_sibling_dir(run_batch(callgraph_folder, tmp_path / 'full'))
+    external = read_sibling_dir(run_batch(callgraph_folder, tmp_path / 'external',
+                                          spill_dir=str(tmp_path / 'spill'), chunk_rows=50, run_records=40))
+    assert len(full) > 0
+    pd.testing.assert_frame_equal(external, full)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import run_batch
+from sibling_store import SiblingStore, build_sibling_store
+
+
+@pytest.fixture
+def store(callgraph_folder, tmp_path):
+    sibling_dir = run_batch(callgraph_folder, tmp_path / 'out')
+    frames = []
+    for i, path in enumerate(sorted((tmp_path / 'out' / 'siblings').iterdir())):
+        df = pd.read_csv(path)
+        # Quoted line breaks must not shift any segment's byte range
+        if i % 2 == 0:
+            df.loc[df.index[::3], 'dminstanceid1'] = 'POD\nsplit'
+        if i % 3 == 0:
+            df.loc[df.index[1::4], 'um'] = None
+        df.to_csv(path, index=False)
+        frames.append(df)
+    records = pd.concat(frames, ignore_index=True)
+    return SiblingStore(build_sibling_store(sibling_dir, str(tmp_path / 'store'))), records
+
+
+def same_rows(actual, expected):
+    actual = actual.astype(str)
+    expected = expected.astype(str)[list(actual.columns)]
+    key = list(actual.columns)
+    pd.testing.assert_frame_equal(actual.sort_values(key).reset_index(drop=True),
+                                  expected.sort_values(key).reset_index(drop=True))
+
+
+def test_pair_queries(store):
+    store, records = store
+    assert (records['dminstanceid1'] == 'POD\nsplit').any()
+    for (dm1, dm2), expected in records.groupby(['dm1', 'dm2']):
+        same_rows(store.query(dm2, dm1), expected)
+    assert store.pairs().sum() == len(records)
+
+
+def test_um_queries(store):
+    store, records = store
+    for (dm1, dm2, um), expected in records.groupby(['dm1', 'dm2', 'um']):
+        same_rows(store.query(dm1, dm2, um=um), expected)
+
+
+def test_time_range_queries(store):
+    store, records = store
+    pair_start = np.minimum(records['dm1_start_time'], records['dm2_start_time'])
+    low, high = np.percentile(pair_start, [30, 60])
+    dm1, dm2 = records.groupby(['dm1', 'dm2']).size().idxmax()
+    in_pair = (records['dm1'] == dm1) & (records['dm2'] == dm2)
+    same_rows(store.query(dm1, dm2, start=low, end=high),
+              records[in_pair & (pair_start >= low) & (pair_start <= high)])
+    same_rows(store.query(start=low), records[pair_start >= low])
+    assert store.query('MS_none', 'MS_other').empty
@@ -0,0 +1,74 @@
+import asyncio
+import csv
+import io
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from conftest import make_callgraph, read_sibling_dir, run_batch
+from sibling_identifier import SIBLING_FIELDNAMES, find_sibling_pairs
+from stream_classifier import StreamingSiblingClassifier, consume, replay_lines
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stream_classifier.py')
+# Keep every trace resident so the stream sees the same groups as the batch run
+STREAM_ARGS = ['--ttl', str(10 ** 12), '--stats-interval', '3600']
+
+
+def sorted_frame(text):
+    df = pd.read_csv(io.StringIO(text), dtype=str)
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def replay(paths):
+    classifier = StreamingSiblingClassifier(ttl_ms=10 ** 12)
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=SIBLING_FIELDNAMES, lineterminator='\n')
+    writer.writeheader()
+    for path in paths:
+        asyncio.run(consume(replay_lines(path), classifier, writer, output))
+    return output.getvalue()
+
+
+def test_replay_matches_batch(callgraph_folder, tmp_path):
+    batch = read_sibling_dir(run_batch(callgraph_folder, tmp_path / 'batch'))
+    paths = sorted(str(path) for path in callgraph_folder.iterdir())
+    streamed = sorted_frame(replay(paths))
+    assert len(batch) > 0
+    pd.testing.assert_frame_equal(streamed, batch)
+
+
+@pytest.mark.parametrize('source', ['stdin', 'pipe'])
+def test_regular_file_sources(callgraph_folder, source):
+    path = str(callgraph_folder / 'CallGraph_0.csv')
+    if source == 'stdin':
+        with open(path) as f:
+            result = subprocess.run([sys.executable, SCRIPT] + STREAM_ARGS, stdin=f,
+                                    capture_output=True, text=True, timeout=60)
+    else:
+        result = subprocess.run([sys.executable, SCRIPT, '--pipe', path] + STREAM_ARGS,
+                                capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    pd.testing.assert_frame_equal(sorted_frame(result.stdout), sorted_frame(replay([path])))
+
+
+def test_calls_without_trace_or_um_are_skipped(tmp_path):
+    df = make_callgraph(n_traces=40, seed=9)
+    df.loc[df.index[::4], 'um'] = None
+    df.loc[df.index[1::17], 'traceid'] = None
+    path = tmp_path / 'CallGraph.csv'
+    df.to_csv(path, index=False)
+
+    streamed = sorted_frame(replay([str(path)]))
+    expected = find_sibling_pairs(df).astype(str)
+    expected = expected.sort_values(list(expected.columns)).reset_index(drop=True)
+    assert len(expected) > 0 and streamed['um'].notna().all()
+    pd.testing.assert_frame_equal(streamed, expected)
+
+    classifier = StreamingSiblingClassifier()
+    for row in df.head(8).fillna('').astype(str).to_dict('records'):
+        classifier.process_record(row)
+    missing = (df.head(8)[['traceid', 'um']].isna().any(axis=1)).sum()
+    assert classifier.stats['skipped'] == missing
@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+
+from asof_join import TIME_INTERVAL
+from conftest import make_callgraph, run_batch
+from window_driver import pair_stats, run_windows, trace_windows, window_dir
+
+PAIR_COLUMNS = ['dm1', 'dm2', 'total', 'concurrent', 'sequential']
+
+
+def test_windows_keep_traces_whole(tmp_path):
+    df = make_callgraph()
+    # Move the longest trace onto the first window boundary so its calls fall on both sides
+    spans = df.groupby('traceid')['timestamp'].agg(lambda ts: ts.max() - ts.min())
+    traceid = spans.idxmax()
+    straddling = df['traceid'] == traceid
+    df.loc[straddling, 'timestamp'] += TIME_INTERVAL - 5 - df.loc[straddling, 'timestamp'].min()
+    assert (df.loc[straddling, 'timestamp'] >= TIME_INTERVAL).any()
+    folder = tmp_path / 'callgraph'
+    folder.mkdir()
+    df.to_csv(folder / 'CallGraph_0.csv', index=False)
+
+    windows_dir = str(tmp_path / 'windows')
+    totals, _ = run_windows(str(folder), windows_dir=windows_dir, window_ms=TIME_INTERVAL,
+                            with_metrics=False, keep_partitions=True)
+
+    windows_by_trace, overhang = trace_windows(str(folder), TIME_INTERVAL)
+    assert windows_by_trace[traceid] == 0 and overhang > 0
+    part = pd.read_csv(os.path.join(window_dir(windows_dir, 0), 'callgraph', 'part.csv'))
+    assert straddling.sum() == (part['traceid'] == traceid).sum()
+
+    expected = pair_stats(run_batch(folder, tmp_path / 'full'))
+    pd.testing.assert_frame_equal(
+        totals[PAIR_COLUMNS].sort_values(['dm1', 'dm2']).reset_index(drop=True),
+        expected[PAIR_COLUMNS].sort_values(['dm1', 'dm2']).reset_index(drop=True))
+
+
+def test_repartition_leaves_other_files(callgraph_folder, tmp_path):
+    windows_dir = tmp_path / 'windows'
+    (windows_dir / 'notes').mkdir(parents=True)
+    (windows_dir / 'notes' / 'keep.txt').write_text('keep')
+    (windows_dir / 'keep.csv').write_text('a\n1\n')
+    stale = window_dir(str(windows_dir), 99 * TIME_INTERVAL)
+    os.makedirs(stale)
+
+    run_windows(str(callgraph_folder), windows_dir=str(windows_dir), window_ms=TIME_INTERVAL,
+                with_metrics=False)
+    assert (windows_dir / 'notes' / 'keep.txt').read_text() == 'keep'
+    assert (windows_dir / 'keep.csv').exists()
+    assert not os.path.exists(stale)
+    assert (windows_dir / 'pair_stats.csv').exists()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Time-window partitioned driver for traces longer than a few minutes.
+
+The CallGraph files (and, optionally, the MSMetrics/MSRTMCR folders) are
+split into windows aligned to the 60s metric grid (one hour by default)
+with chunked passes. Each window is then processed on
+its own with bounded memory:
+    1. sibling detection (SimpleSiblingAnalyzer) into <window>/siblings
+    2. columnar msname indexes built from the window's metric rows
+    3. enrichment of every sibling file into <window>/contextual
+    4. per-pair totals in <window>/pair_stats.csv
+
+Finally the per-window pair statistics are merged into global totals
+(output/windows/pair_stats.csv) and per-pair concurrency trends
+(output/windows/pair_trends.csv).
+
+Calls are assigned to windows by trace: every call goes to the window of
+its trace's first call, so sibling groups never straddle a boundary. Metric
+rows are partitioned with a margin wide enough to cover the calls of traces
+that run past their window's end.
+"""
+
+import os
+import glob
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+
+from asof_join import DEFAULT_WINDOW, TIME_INTERVAL, load_columnar_index
+from build_index import build_columnar_index
+from contextual_gather_optimized import enrich_dataframe
+from sibling_identifier import SimpleSiblingAnalyzer
+
+WINDOW_MS = 60 * TIME_INTERVAL
+METRIC_COLUMNS = ['cpu_utilization', 'memory_utilization']
+MCR_COLUMNS = ['providerrpc_mcr']
+
+
+def window_dir(windows_dir, window_start):
+    """Directory holding one window's partitions and outputs"""
+    return os.path.join(windows_dir, f"window_{int(window_start):013d}")
+
+
+def clear_windows(windows_dir):
+    """Remove the window folders and files written by run_windows, leaving anything else"""
+    for path in glob.glob(os.path.join(windows_dir, "window_*")):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+    for name in (".partitioned", "pair_stats.csv", "pair_trends.csv"):
+        path = os.path.join(windows_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def trace_windows(input_folder, window_ms=WINDOW_MS, chunk_size=1000000):
+    """
+    Window start of every trace (the window of its first call) in one chunked pass.
+    Also returns how far, in ms, the latest call of any trace runs past the end
+    of its window.
+    """
+    partials = []
+    for csv_file in sorted(glob.glob(os.path.join(input_folder, "*.csv"))):
+        for chunk in pd.read_csv(csv_file, usecols=['traceid', 'timestamp'], chunksize=chunk_size):
+            chunk = chunk.dropna(subset=['traceid', 'timestamp'])
+            partials.append(chunk.groupby('traceid')['timestamp'].agg(['min', 'max']))
+    if not partials:
+        return pd.Series(dtype=np.int64), 0
+
+    bounds = pd.concat(partials).groupby(level=0).agg({'min': 'min', 'max': 'max'})
+    starts = (bounds['min'].values.astype(np.int64) // window_ms) * window_ms
+    overhang = int(max((bounds['max'].values.astype(np.int64) - starts - window_ms).max(), 0))
+    return pd.Series(starts, index=bounds.index), overhang
+
+
+def write_partition(rows, windows_dir, window_start, subdir):
+    """Append rows to <window>/<subdir>/part.csv"""
+    out_dir = os.path.join(window_dir(windows_dir, window_start), subdir)
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, "part.csv")
+    rows.to_csv(out_path, mode='a', index=False, header=not os.path.exists(out_path))
+
+
+def partition_folder(input_folder, windows_dir, subdir, window_ms=WINDOW_MS, margin=0,
+                     usecols=None, only=None, chunk_size=1000000, windows_by_trace=None):
+    """
+    Split every CSV in input_folder into <window>/<subdir>/part.csv by timestamp.
+    Rows within `margin` ms of a window also go to that window (metric rows near
+    a boundary are needed by the as-of join on both sides). With `only`, rows
+    are written only for those window starts. With `windows_by_trace` (see
+    trace_windows), each row goes to its trace's window instead. Returns the
+    window starts written.
+    """
+    windows = set()
+    csv_files = sorted(glob.glob(os.path.join(input_folder, "*.csv")))
+    print(f"Partitioning {len(csv_files)} CSV files from {input_folder} into {window_ms / 1000:.0f}s windows")
+    for csv_file in csv_files:
+        rows = 0
+        for chunk in pd.read_csv(csv_file, usecols=usecols, chunksize=chunk_size):
+            chunk = chunk.dropna(subset=['timestamp'])
+            if windows_by_trace is not None:
+                chunk = chunk.dropna(subset=['traceid'])
+                starts = windows_by_trace.reindex(chunk['traceid'].values).values.astype(np.int64)
+                for start in np.unique(starts):
+                    if only is not None and start not in only:
+                        continue
+                    write_partition(chunk[starts == start], windows_dir, start, subdir)
+                    windows.add(int(start))
+                rows += len(chunk)
+                continue
+            timestamps = chunk['timestamp'].values.astype(np.int64)
+            first = (timestamps.min() - margin) // window_ms
+            last = (timestamps.max() + margin) // window_ms
+            for w in range(int(first), int(last) + 1):
+                start = w * window_ms
+                if only is not None and start not in only:
+                    continue
+                mask = (timestamps >= start - margin) & (timestamps < start + window_ms + margin)
+                if not mask.any():
+                    continue
+                write_partition(chunk[mask], windows_dir, start, subdir)
+                windows.add(start)
+            rows += len(chunk)
+        print(f"   ✓ {os.path.basename(csv_file)}: {rows:,} rows")
+    return sorted(windows)
+
+
+def pair_stats(sibling_dir):
+    """Per-pair record, concurrent and sequential counts for one sibling folder"""
+    rows = []
+    for csv_file in glob.glob(os.path.join(sibling_dir, "*.csv")):
+        df = pd.read_csv(csv_file)
+        if df.empty:
+            continue
+        if 'multiplicity' in df.columns:
+            total = int(df['multiplicity'].sum())
+            concurrent = int(df['concurrent'].sum())
+        else:
+            total = len(df)
+            concurrent = int((df['execution_order'] == 'concurrent').sum())
+        rows.append({
+            'dm1': df['dm1'].iloc[0],
+            'dm2': df['dm2'].iloc[0],
+            'total': total,
+            'concurrent': concurrent,
+            'sequential': total - concurrent,
+            'traces': df['traceid'].nunique(),
+        })
+    return pd.DataFrame(rows, columns=['dm1', 'dm2', 'total', 'concurrent', 'sequential', 'traces'])
+
+
+def enrich_window(sibling_dir, index_dir, output_dir, window=DEFAULT_WINDOW):
+    """Enrich every sibling file of a window against the window's own indexes"""
+    metrics_index = load_columnar_index(os.path.join(index_dir, 'MSMetrics', 'columnar_msname'))
+    mcr_index = load_columnar_index(os.path.join(index_dir, 'MSRTMCR', 'columnar_msname'))
+    os.makedirs(output_dir, exist_ok=True)
+    for csv_file in glob.glob(os.path.join(sibling_dir, "*.csv")):
+        output_df = enrich_dataframe(pd.read_csv(csv_file), metrics_index, mcr_index, window=window)
+        name = os.path.basename(csv_file).replace('sibling_', 'contextual_', 1)
+        output_df.to_csv(os.path.join(output_dir, name), index=False)
+
+
+def run_window(windows_dir, window_start, compact=False, with_metrics=True):
+    """Run the sibling, index and enrichment stages for one window"""
+    started = time.time()
+    wdir = window_dir(windows_dir, window_start)
+    print(f"\n=== Window {window_start} ({wdir}) ===")
+
+    analyzer = SimpleSiblingAnalyzer(os.path.join(wdir, "callgraph"), compact=compact)
+    sibling_dir = os.path.join(wdir, analyzer.sibling_subdir)
+    # The analyzer appends, so drop output left by an interrupted run
+    if os.path.exists(sibling_dir):
+        shutil.rmtree(sibling_dir)
+    analyzer.run_analysis(output_dir=wdir)
+
+    data_dir = os.path.join(wdir, "data")
+    if with_metrics:
+        if all(os.path.exists(os.path.join(data_dir, name)) for name in ('MSMetrics', 'MSRTMCR')):
+            build_columnar_index(os.path.join(data_dir, 'MSMetrics'), 'msname', METRIC_COLUMNS)
+            build_columnar_index(os.path.join(data_dir, 'MSRTMCR'), 'msname', MCR_COLUMNS)
+            enrich_window(sibling_dir, data_dir, os.path.join(wdir, "contextual"))
+        else:
+            print(f"No metric rows for window {window_start}; skipping index and enrichment")
+
+    stats = pair_stats(sibling_dir)
+    stats.insert(0, 'window_start', window_start)
+    # Written last: its presence marks the window as done
+    stats.to_csv(os.path.join(wdir, "pair_stats.csv"), index=False)
+    print(f"Window {window_start}: {len(stats):,} pairs in {time.time() - started:.2f} seconds")
+    return stats
+
+
+def merge_pair_stats(window_stats, min_records=10):
+    """
+    Combine per-window pair statistics into global totals and per-pair trends.
+    The trend is the least-squares slope of the concurrent ratio per hour over
+    the windows where the pair has at least min_records records.
+    """
+    trends = pd.concat(window_stats, ignore_index=True)
+    trends['concurrent_ratio'] = trends['concurrent'] / trends['total']
+    trends = trends.sort_values(['dm1', 'dm2', 'window_start']).reset_index(drop=True)
+
+    totals = trends.groupby(['dm1', 'dm2']).agg(
+        total=('total', 'sum'),
+        concurrent=('concurrent', 'sum'),
+        sequential=('sequential', 'sum'),
+        windows=('window_start', 'size'),
+        first_window=('window_start', 'min'),
+        last_window=('window_start', 'max'),
+    ).reset_index()
+    totals['concurrent_ratio'] = totals['concurrent'] / totals['total']
+
+    slopes = {}
+    usable = trends[trends['total'] >= min_records]
+    for (dm1, dm2), group in usable.groupby(['dm1', 'dm2']):
+        if len(group) >= 2:
+            x = group['window_start'].values / (60 * TIME_INTERVAL)
+            slopes[(dm1, dm2)] = np.polyfit(x, group['concurrent_ratio'].values, 1)[0]
+    totals['concurrent_ratio_slope_per_hour'] = [slopes.get(key, np.nan) for key in
+                                                 zip(totals['dm1'], totals['dm2'])]
+    totals = totals.sort_values('total', ascending=False).reset_index(drop=True)
+    return totals, trends
+
+
+def run_windows(callgraph_folder, metrics_base="output/data", windows_dir="output/windows",
+                window_ms=WINDOW_MS, compact=False, with_metrics=True, force=False, keep_partitions=False):
+    """Partition the inputs, process every window and merge the results"""
+    if window_ms % TIME_INTERVAL != 0:
+        raise ValueError(f"Window size must be a multiple of the {TIME_INTERVAL} ms metric interval")
+    started = time.time()
+
+    marker = os.path.join(windows_dir, ".partitioned")
+    if force or not os.path.exists(marker):
+        # Partitions are appended to, so a half-finished run starts over
+        clear_windows(windows_dir)
+        os.makedirs(windows_dir, exist_ok=True)
+        windows_by_trace, overhang = trace_windows(callgraph_folder, window_ms)
+        windows = partition_folder(callgraph_folder, windows_dir, "callgraph", window_ms,
+                                   windows_by_trace=windows_by_trace)
+        del windows_by_trace
+        if with_metrics:
+            for name, columns in (('MSMetrics', ['timestamp', 'msname'] + METRIC_COLUMNS),
+                                  ('MSRTMCR', ['timestamp', 'msname'] + MCR_COLUMNS)):
+                folder = os.path.join(metrics_base, name)
+                if os.path.exists(folder):
+                    partition_folder(folder, windows_dir, os.path.join("data", name), window_ms,
+                                     margin=DEFAULT_WINDOW + overhang, usecols=columns,
+                                     only=set(windows))
+                else:
+                    print(f"Metrics folder not found: {folder}")
+        with open(marker, 'w') as f:
+            f.write('\n'.join(str(w) for w in windows))
+    else:
+        with open(marker) as f:
+            windows = [int(line) for line in f if line.strip()]
+        print(f"Reusing partitions of {len(windows)} windows in {windows_dir}")
+
+    window_stats = []
+    for idx, window_start in enumerate(windows, 1):
+        stats_path = os.path.join(window_dir(windows_dir, window_start), "pair_stats.csv")
+        if os.path.exists(stats_path):
+            print(f"[{idx}/{len(windows)}] Window {window_start} already done")
+            window_stats.append(pd.read_csv(stats_path))
+            continue
+        print(f"[{idx}/{len(windows)}] Processing window {window_start}")
+        window_stats.append(run_window(windows_dir, window_start, compact=compact,
+                                       with_metrics=with_metrics))
+        if not keep_partitions:
+            shutil.rmtree(os.path.join(window_dir(windows_dir, window_start), "callgraph"))
+
+    if not window_stats:
+        raise ValueError(f"No CallGraph rows found in {callgraph_folder}")
+    totals, trends = merge_pair_stats(window_stats)
+    totals.to_csv(os.path.join(windows_dir, "pair_stats.csv"), index=False)
+    trends.to_csv(os.path.join(windows_dir, "pair_trends.csv"), index=False)
+
+    print("\n" + "=" * 60)
+    print(f"Processed {len(windows)} windows in {time.time() - started:.2f} seconds")
+    print(f"   • Unique sibling pairs: {len(totals):,}")
+    print(f"   • Total records: {totals['total'].sum():,}")
+    print(f"   • Global pair stats: {os.path.join(windows_dir, 'pair_stats.csv')}")
+    print(f"   • Per-window trends: {os.path.join(windows_dir, 'pair_trends.csv')}")
+    print("=" * 60)
+    return totals, trends
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the sibling pipeline per time window and merge the results')
+    parser.add_argument('callgraph_folder', help='Folder containing CallGraph CSV files')
+    parser.add_argument('--metrics-base', default='output/data',
+                        help='Folder containing MSMetrics and MSRTMCR')
+    parser.add_argument('--windows-dir', default='output/windows', help='Per-window output root')
+    parser.add_argument('--window-minutes', type=int, default=60, help='Window length in minutes')
+    parser.add_argument('--compact', action='store_true', help='Write compact sibling rows')
+    parser.add_argument('--no-metrics', action='store_true', help='Skip the index and enrichment stages')
+    parser.add_argument('--force', action='store_true', help='Re-partition and recompute every window')
+    parser.add_argument('--keep-partitions', action='store_true',
+                        help='Keep the per-window CallGraph partitions after processing')
+    args = parser.parse_args()
+
+    run_windows(args.callgraph_folder, metrics_base=args.metrics_base, windows_dir=args.windows_dir,
+                window_ms=args.window_minutes * TIME_INTERVAL, compact=args.compact,
+                with_metrics=not args.no_metrics, force=args.force, keep_partitions=args.keep_partitions)
+
+
+if __name__ == "__main__":
+    main()